@@ -1,22 +1,47 @@
+import hashlib
+import time
 
 from fastapi import HTTPException, Cookie, Header, Depends
 from fastapi.security import OAuth2PasswordBearer
 import jwt
 from jwt import PyJWTError
+from app.core.cache import TTLCache
 from app.core.config import settings
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="users/login")
 
+# digest del token -> user_id. Solo tokens con firma válida
+token_cache = TTLCache("token", settings.TOKEN_CACHE_MAX_ENTRIES, settings.TOKEN_CACHE_TTL_SECONDS)
+
+
+def verify_token(token: str) -> str:
+    """
+    Valida el JWT y devuelve el user_id (sub). Lanza PyJWTError si no es válido.
+
+    Los tokens ya verificados se guardan (por digest, no el token en claro)
+    hasta su exp como máximo, así que un cliente que hace muchas llamadas
+    no repite el decode + HMAC en cada una.
+    """
+    key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    user_id = token_cache.get(key)
+    if user_id is not None:
+        return user_id
+
+    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    user_id = payload.get("sub")
+    if user_id is None:
+        raise jwt.InvalidTokenError("Token inválido: falta user_id")
+
+    exp = payload.get("exp")
+    token_cache.set(key, user_id, ttl=exp - time.time() if exp is not None else None)
+    return user_id
+
+
 async def get_current_user(
     token: str = Depends(oauth2_scheme)
 ) -> str:
     # Esta función ahora valida el token LOCALMENTE, sin llamar a otro servicio.
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(status_code=401, detail="Token inválido: falta user_id")
-        return user_id
+        return verify_token(token)
     except PyJWTError:
         raise HTTPException(status_code=401, detail="Token inválido o expirado")
-
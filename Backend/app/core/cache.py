@@ -0,0 +1,92 @@
+#core/cache
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+from prometheus_client import Counter
+
+CACHE_HITS = Counter("adoppets_cache_hits_total", "Lecturas servidas desde la caché", ["cache"])
+CACHE_MISSES = Counter("adoppets_cache_misses_total", "Lecturas que no estaban en la caché", ["cache"])
+
+
+class TTLCache:
+    """
+    Caché en memoria (por proceso) con TTL y tamaño máximo (LRU).
+
+    get_or_load() agrupa las cargas concurrentes de la misma clave: si diez
+    requests fallan a la vez, solo una va a Mongo y las demás esperan su
+    resultado. Los valores se comparten entre requests, no los modifiques.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        # Cambia en cada invalidación: una carga que empezó antes no se guarda
+        self._generation = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Lectura sin carga (cuenta hit/miss). Las entradas vencidas se descartan."""
+        entry = self._data.get(key)
+        if entry and entry[0] > time.monotonic():
+            self._data.move_to_end(key)
+            CACHE_HITS.labels(self.name).inc()
+            return entry[1]
+
+        if entry:
+            del self._data[key]
+        CACHE_MISSES.labels(self.name).inc()
+        return default
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None):
+        """Guarda un valor; `ttl` (si se da) no puede superar el de la caché."""
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]):
+        entry = self._data.get(key)
+        if entry and entry[0] > time.monotonic():
+            self._data.move_to_end(key)
+            CACHE_HITS.labels(self.name).inc()
+            return entry[1]
+
+        CACHE_MISSES.labels(self.name).inc()
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, loader))
+            self._inflight[key] = task
+
+        # shield: si un cliente se desconecta no se cancela la carga de los demás
+        return await asyncio.shield(task)
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]):
+        generation = self._generation
+        try:
+            value = await loader()
+        finally:
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+
+        if generation == self._generation:
+            self.set(key, value)
+
+        return value
+
+    def invalidate(self, key: Hashable):
+        self._generation += 1
+        self._data.pop(key, None)
+        self._inflight.pop(key, None)
+
+    def clear(self):
+        self._generation += 1
+        self._data.clear()
+        self._inflight.clear()
@@ -13,8 +13,62 @@ class Settings(BaseSettings):
     EMAIL_USER: str = Field(...)
     EMAIL_PASSWORD: str = Field(...)
     EMAIL_FROM: str = Field(...)
+    # Modo demo: los correos se imprimen en vez de enviarse por SMTP
+    DEBUG_EMAIL: bool = False
+    # Cola de correos (email_outbox)
+    EMAIL_BATCH_SIZE: int = 20
+    EMAIL_MAX_ATTEMPTS: int = 5
+    EMAIL_RETRY_BASE_SECONDS: float = 30
     AUTH_SERVICE_URL: str = "http://127.0.0.1:8001"
 
+    # Tamaño máximo de cada imagen subida
+    MAX_UPLOAD_BYTES: int = 10 * 1024 * 1024
+    # Procesos para generar thumbnails/WebP de las imágenes
+    IMAGE_WORKERS: int = 2
+
+    # Caché en memoria del feed y de posts individuales
+    FEED_CACHE_TTL_SECONDS: float = 30
+    FEED_CACHE_MAX_ENTRIES: int = 256
+    POST_CACHE_MAX_ENTRIES: int = 1024
+
+    # Hilos para bcrypt (máximo de hashes simultáneos)
+    PASSWORD_HASH_WORKERS: int = 4
+
+    # Tokens JWT ya verificados (HTTP y WebSocket); nunca más allá de su exp
+    TOKEN_CACHE_MAX_ENTRIES: int = 4096
+    TOKEN_CACHE_TTL_SECONDS: float = 300
+
+    # Fan-out del chat entre réplicas: "mongo" (colección capped) o "local" (un proceso)
+    CHAT_FANOUT: str = "mongo"
+    CHAT_FANOUT_CAPPED_BYTES: int = 16 * 1024 * 1024
+
+    # Cola de salida por WebSocket: si se llena, "disconnect" cierra el
+    # socket (el cliente reconecta) y "drop" descarta el mensaje para ese cliente
+    WS_SEND_QUEUE_SIZE: int = 100
+    WS_SEND_TIMEOUT_SECONDS: float = 10
+    WS_SLOW_CONSUMER_POLICY: str = "disconnect"
+    # Heartbeat: el cliente manda {"type": "ping"} cada ~25 s; sin nada del
+    # cliente en WS_HEARTBEAT_TIMEOUT_SECONDS el barrido cierra el socket
+    WS_HEARTBEAT_TIMEOUT_SECONDS: float = 75
+    WS_HEARTBEAT_SWEEP_SECONDS: float = 15
+    # Presencia: documento por usuario conectado, renovado cada TTL/3
+    WS_PRESENCE_TTL_SECONDS: float = 60
+    # "Escribiendo...": como mucho un evento por conexión en esta ventana
+    WS_TYPING_THROTTLE_SECONDS: float = 2
+    # Enlace multiplexado del frontend (/chat/mux): mensajes del navegador
+    # pendientes por canal; si se llena, se cierra ese canal (no el enlace)
+    WS_MUX_RECEIVE_QUEUE_SIZE: int = 32
+
+    # Tamaño máximo del texto de un mensaje (bytes UTF-8); más grande se rechaza
+    CHAT_MAX_MESSAGE_BYTES: int = 16 * 1024
+    # Mensajes de chat: difundir primero y guardar en lotes (insert_many)
+    CHAT_WRITE_BEHIND: bool = False
+    CHAT_FLUSH_INTERVAL_MS: float = 50
+    CHAT_FLUSH_MAX_BATCH: int = 200
+    CHAT_WRITE_BEHIND_MAX_PENDING: int = 10000
+    # Al apagar, tiempo máximo para guardar lo pendiente si Mongo no responde
+    CHAT_WRITE_BEHIND_STOP_TIMEOUT_SECONDS: float = 10
+
 
     class Config:
         env_file = ".env"
@@ -3,39 +3,86 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from app.core.config import settings
 
-def send_email(to_email: str, subject: str, html_content: str):
+
+def build_message(to_email: str, subject: str, html_content: str | None = None, text_content: str | None = None):
+    message = MIMEMultipart("alternative")
+    message["Subject"] = subject
+    message["From"] = settings.EMAIL_FROM or settings.EMAIL_USER
+    message["To"] = to_email
+
+    # Primero texto plano, luego HTML (el cliente muestra la última que entienda)
+    if text_content:
+        message.attach(MIMEText(text_content, "plain"))
+    if html_content:
+        message.attach(MIMEText(html_content, "html"))
+
+    return message
+
+
+class SMTPMailer:
+    """
+    Sesión SMTP reutilizable: conecta una vez (STARTTLS + login) y envía
+    varios correos por la misma conexión. No es thread-safe.
+    """
+
+    def __init__(self):
+        self._server: smtplib.SMTP | None = None
+
+    def _connect(self):
+        server = smtplib.SMTP(settings.EMAIL_HOST, int(settings.EMAIL_PORT), timeout=30)
+        server.starttls() # Seguridad
+        server.login(settings.EMAIL_USER, settings.EMAIL_PASSWORD)
+        self._server = server
+
+    @property
+    def connected(self) -> bool:
+        return self._server is not None
+
+    def send(self, message):
+        if self._server is None:
+            self._connect()
+        try:
+            self._server.send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            # El servidor cerró la sesión por inactividad: reconectar una vez
+            self.close()
+            self._connect()
+            self._server.send_message(message)
+
+    def close(self):
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        self._server = None
+
+
+class ConsoleMailer:
     """
-    Envía un correo electrónico usando SMTP de Gmail (o el configurado).
+    Sustituto local de SMTP (DEBUG_EMAIL=true o tests): no envía nada,
+    imprime el correo y lo guarda en `sent`.
     """
-    try:
-        sender_email = settings.EMAIL_USER
-        password = settings.EMAIL_PASSWORD
-        smtp_server = settings.EMAIL_HOST
-        smtp_port = int(settings.EMAIL_PORT)
-
-        message = MIMEMultipart("alternative")
-        message["Subject"] = subject
-        message["From"] = settings.EMAIL_FROM or sender_email
-        message["To"] = to_email
-
-        # Convertir el contenido HTML a objeto MIME
-        part = MIMEText(html_content, "html")
-        message.attach(part)
-
-        # Conectar al servidor SMTP
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls() # Seguridad
-            server.login(sender_email, password)
-            server.sendmail(sender_email, to_email, message.as_string())
-            
-        print(f"✅ Correo enviado a {to_email}")
-        return True
-
-    except Exception as e:
-        print(f"❌ Error enviando correo a {to_email}: {e}")
-        return False
-
-def send_verification_email(to_email: str, code: str):
+
+    connected = False
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, message):
+        self.sent.append(message)
+        print(f"📧 [DEBUG_EMAIL] Para {message['To']}: {message['Subject']}")
+
+    def close(self):
+        pass
+
+
+def get_mailer():
+    return ConsoleMailer() if settings.DEBUG_EMAIL else SMTPMailer()
+
+
+def render_verification_email(code: str) -> tuple[str, str]:
     subject = "Código de Verificación - AdopPet"
     html_content = f"""
     <div style="font-family: Arial, sans-serif; padding: 20px; color: #333;">
@@ -47,10 +94,10 @@ def send_verification_email(to_email: str, code: str):
         <p>Si no solicitaste este código, ignora este mensaje.</p>
     </div>
     """
-    return send_email(to_email, subject, html_content)
+    return subject, html_content
 
 
-def send_password_reset_email(to_email: str, link: str):
+def render_password_reset_email(link: str) -> tuple[str, str]:
     subject = "Recuperar Contraseña - AdopPet"
     html_content = f"""
     <div style="font-family: Arial, sans-serif; padding: 20px; color: #333;">
@@ -66,4 +113,4 @@ def send_password_reset_email(to_email: str, link: str):
         <p>Este enlace expirará pronto.</p>
     </div>
     """
-    return send_email(to_email, subject, html_content)
+    return subject, html_content
@@ -0,0 +1,64 @@
+#core/etag
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Any
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+# id(objeto) -> (objeto, body, etag). Guardar el objeto evita que su id se
+# reutilice mientras la entrada exista. Solo tiene sentido para valores que
+# vienen de la caché (mismo objeto en cada hit): así no se re-serializan.
+_RENDERED: OrderedDict[int, tuple[Any, bytes, str]] = OrderedDict()
+_RENDERED_MAX = 512
+
+
+def render_json(data: Any, memo: bool = False) -> tuple[bytes, str]:
+    """Serializa a JSON y calcula un ETag fuerte (hash del contenido)."""
+    if memo:
+        hit = _RENDERED.get(id(data))
+        if hit and hit[0] is data:
+            _RENDERED.move_to_end(id(data))
+            return hit[1], hit[2]
+
+    body = json.dumps(
+        jsonable_encoder(data), ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+    etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+    if memo:
+        _RENDERED[id(data)] = (data, body, etag)
+        while len(_RENDERED) > _RENDERED_MAX:
+            _RENDERED.popitem(last=False)
+
+    return body, etag
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match usa comparación débil: se ignora el prefijo W/
+    candidates = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return etag in candidates
+
+
+def etag_response(
+    request: Request,
+    data: Any,
+    memo: bool = False,
+    cache_control: str = "no-cache",
+) -> Response:
+    """
+    Respuesta JSON con ETag. Si el cliente ya tiene esa versión
+    (If-None-Match) responde 304 sin cuerpo.
+    """
+    body, etag = render_json(data, memo=memo)
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,235 @@
+#core/pubsub
+"""
+Fan-out de eventos de chat entre procesos (workers de uvicorn / réplicas).
+
+Cada proceso solo tiene los WebSockets que se conectaron a él; broadcast()
+publica el evento en el broker y cada proceso lo entrega a sus sockets.
+
+- LocalBroker: un solo proceso (desarrollo / tests).
+- MongoBroker: colección capped `ws_events` leída con un cursor tailable.
+  Funciona con el Mongo standalone del cluster (los change streams
+  necesitarían un replica set).
+
+Los eventos efímeros (typing, presencia) no se guardan en `messages` ni
+se reponen al reconectar. Con una sola réplica tampoco tocan Mongo; con
+varias sí pasan por ws_events, porque es el único canal entre procesos
+(los workers de uvicorn comparten puerto y no se pueden direccionar uno
+a uno). ws_events es capped: cada evento se pisa solo al dar la vuelta.
+"""
+import asyncio
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict
+
+from bson import ObjectId
+from prometheus_client import Counter
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid, PyMongoError
+
+from app.core.config import settings
+
+Handler = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+FANOUT_EVENTS = Counter(
+    "adoppets_ws_fanout_events_total",
+    "Eventos de chat publicados/recibidos por el broker (local_only: efímeros sin otras réplicas)",
+    ["direction"],
+)
+
+
+class LocalBroker:
+    """Entrega directa dentro del mismo proceso."""
+
+    def __init__(self):
+        self._handler: Handler | None = None
+
+    async def start(self, handler: Handler):
+        self._handler = handler
+
+    async def stop(self):
+        self._handler = None
+
+    async def publish(self, room_id: str, message: Dict[str, Any], ephemeral: bool = False):
+        FANOUT_EVENTS.labels("published").inc()
+        if self._handler:
+            await self._handler(room_id, message)
+
+
+class MongoBroker:
+    """
+    Publica en una colección capped y sigue la cola con un cursor tailable.
+
+    Los eventos propios se entregan al publicar (sin esperar la vuelta por
+    Mongo) y se ignoran al leerlos de la colección.
+
+    El cursor queda abierto mientras viva; solo si muere (colección
+    recreada, Mongo reiniciado) se reabre desde `created_at`, que pone el
+    reloj del servidor al insertar. Como dos réplicas pueden insertar fuera
+    de orden, se relee RESUME_LOOKBACK hacia atrás y se descartan los
+    eventos ya vistos.
+    """
+
+    COLLECTION = "ws_events"
+    RETRY_SECONDS = 1
+    RESUME_LOOKBACK = timedelta(seconds=10)
+    # Réplicas vivas: cada broker renueva su documento en ws_brokers
+    PEERS_COLLECTION = "ws_brokers"
+    HEARTBEAT_SECONDS = 5
+
+    def __init__(self, db, size_bytes: int):
+        self._db = db
+        self._size_bytes = size_bytes
+        self._origin = uuid.uuid4().hex
+        self._handler: Handler | None = None
+        self._task: asyncio.Task | None = None
+        self._heartbeat_task: asyncio.Task | None = None
+        # Otras réplicas vistas en el último heartbeat (hasta saberlo, se asume que hay)
+        self._peers = 1
+        # Eventos ya vistos dentro de la ventana de relectura
+        self._seen: deque[tuple[datetime, Any]] = deque()
+        self._seen_ids: set = set()
+
+    @property
+    def _collection(self):
+        return self._db[self.COLLECTION]
+
+    async def _ensure_collection(self):
+        try:
+            await self._db.create_collection(self.COLLECTION, capped=True, size=self._size_bytes)
+        except CollectionInvalid:
+            pass  # ya existe
+
+        # Un cursor tailable sobre una colección vacía muere al instante
+        if await self._collection.estimated_document_count() == 0:
+            await self._collection.insert_one({"type": "init", "created_at": datetime.utcnow()})
+
+    async def start(self, handler: Handler):
+        self._handler = handler
+        await self._ensure_collection()
+        await self._beat()
+        self._task = asyncio.create_task(self._tail())
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+
+    async def stop(self):
+        for task in (self._task, self._heartbeat_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = None
+        self._heartbeat_task = None
+        self._handler = None
+        try:
+            await self._db[self.PEERS_COLLECTION].delete_one({"_id": self._origin})
+        except PyMongoError as e:
+            print(f"❌ Error dando de baja el broker de chat: {e}")
+
+    async def _beat(self):
+        now = datetime.utcnow()
+        peers = self._db[self.PEERS_COLLECTION]
+        try:
+            await peers.update_one(
+                {"_id": self._origin},
+                {"$set": {"expires_at": now + timedelta(seconds=3 * self.HEARTBEAT_SECONDS)}},
+                upsert=True,
+            )
+            self._peers = await peers.count_documents(
+                {"_id": {"$ne": self._origin}, "expires_at": {"$gt": now}}
+            )
+        except PyMongoError as e:
+            print(f"❌ Error en el heartbeat del broker de chat: {e}")
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.HEARTBEAT_SECONDS)
+            await self._beat()
+
+    async def publish(self, room_id: str, message: Dict[str, Any], ephemeral: bool = False):
+        # Efímeros (typing, presencia): sin otras réplicas no se escriben en
+        # Mongo; con réplicas pasan por ws_events (ver docstring del módulo)
+        if ephemeral and not self._peers:
+            FANOUT_EVENTS.labels("local_only").inc()
+            if self._handler:
+                await self._handler(room_id, message)
+            return
+
+        await self._collection.update_one(
+            {"_id": ObjectId()},
+            {
+                "$setOnInsert": {
+                    "type": "room",
+                    "origin": self._origin,
+                    "room_id": room_id,
+                    "message": message,
+                },
+                # Reloj del servidor: el mismo para todas las réplicas
+                "$currentDate": {"created_at": True},
+            },
+            upsert=True,
+        )
+        FANOUT_EVENTS.labels("published").inc()
+        if self._handler:
+            await self._handler(room_id, message)
+
+    def _remember(self, event) -> bool:
+        """False si el evento ya se había leído (relectura al reabrir)."""
+        if event["_id"] in self._seen_ids:
+            return False
+        created_at = event.get("created_at") or datetime.utcnow()
+        self._seen.append((created_at, event["_id"]))
+        self._seen_ids.add(event["_id"])
+
+        horizon = created_at - self.RESUME_LOOKBACK
+        while self._seen and self._seen[0][0] < horizon:
+            self._seen_ids.discard(self._seen.popleft()[1])
+        return True
+
+    async def _open_cursor(self, since: datetime | None):
+        # Siempre se incluye el último documento: un tailable sin resultados muere
+        last = await self._collection.find_one({}, sort=[("$natural", -1)])
+        if since is None:
+            # Primera apertura: solo lo que llegue de ahora en más
+            if last:
+                self._remember(last)
+            query = {"_id": last["_id"]} if last else {}
+        else:
+            query = {"created_at": {"$gt": since - self.RESUME_LOOKBACK}}
+            if last:
+                query = {"$or": [query, {"_id": last["_id"]}]}
+        return self._collection.find(query, cursor_type=CursorType.TAILABLE_AWAIT)
+
+    async def _tail(self):
+        since: datetime | None = None
+        while True:
+            try:
+                cursor = await self._open_cursor(since)
+                # Un getMore vacío termina el async for, pero el cursor sigue vivo
+                while cursor.alive:
+                    async for event in cursor:
+                        if event.get("created_at"):
+                            since = max(since or event["created_at"], event["created_at"])
+                        if not self._remember(event):
+                            continue
+                        if event.get("type") != "room" or event.get("origin") == self._origin:
+                            continue
+                        FANOUT_EVENTS.labels("received").inc()
+                        try:
+                            await self._handler(event["room_id"], event["message"])
+                        except Exception as e:
+                            print(f"❌ Error entregando evento de chat: {e}")
+            except PyMongoError as e:
+                print(f"❌ Cursor de ws_events cerrado: {e}")
+            if since is None:
+                since = datetime.utcnow()
+            await asyncio.sleep(self.RETRY_SECONDS)
+
+
+def create_broker():
+    if settings.CHAT_FANOUT == "mongo":
+        from app.db.init_db import db
+
+        return MongoBroker(db, settings.CHAT_FANOUT_CAPPED_BYTES)
+    return LocalBroker()
@@ -1,16 +1,57 @@
 #core/security
 from passlib.context import CryptContext
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from prometheus_client import Gauge, Histogram
+import asyncio
+import time
 import jwt
 from app.core.config import settings
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+# bcrypt tarda ~100-300 ms y libera el GIL: se ejecuta en un pool de hilos
+# acotado para no bloquear el event loop (WebSockets, feed...).
+# Si llegan más logins que hilos, esperan en la cola del pool.
+_hash_pool = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="bcrypt",
+)
 
-def verify_password(password: str, hashed: str) -> bool:
-    return pwd_context.verify(password, hashed)
+PASSWORD_HASH_INFLIGHT = Gauge(
+    "adoppets_password_hash_inflight", "Operaciones bcrypt en cola o ejecutándose"
+)
+PASSWORD_HASH_QUEUE_WAIT = Histogram(
+    "adoppets_password_hash_queue_wait_seconds", "Tiempo en cola antes de tener un hilo libre"
+)
+PASSWORD_HASH_DURATION = Histogram(
+    "adoppets_password_hash_duration_seconds", "Duración de cada hash/verify bcrypt", ["op"]
+)
+
+
+async def _run_in_hash_pool(op: str, fn, *args):
+    queued_at = time.perf_counter()
+
+    def job():
+        started_at = time.perf_counter()
+        PASSWORD_HASH_QUEUE_WAIT.observe(started_at - queued_at)
+        try:
+            return fn(*args)
+        finally:
+            PASSWORD_HASH_DURATION.labels(op).observe(time.perf_counter() - started_at)
+
+    PASSWORD_HASH_INFLIGHT.inc()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_pool, job)
+    finally:
+        PASSWORD_HASH_INFLIGHT.dec()
+
+
+async def hash_password(password: str) -> str:
+    return await _run_in_hash_pool("hash", pwd_context.hash, password)
+
+async def verify_password(password: str, hashed: str) -> bool:
+    return await _run_in_hash_pool("verify", pwd_context.verify, password, hashed)
 
 def create_access_token(data: dict, expires_minutes: int = 60):
     to_encode = data.copy()
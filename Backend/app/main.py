@@ -1,14 +1,44 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
+from prometheus_client import make_asgi_app
 from app.routers import (
     user,
     post,
     chat,
     profile, # Profile API might be useful, keep it for now if it has logic
 )
+from app.db.indexes import ensure_indexes
+from app.services.chat_writer import writer as message_writer
+from app.services.email_outbox import dispatcher as email_dispatcher
+from app.services.presence import PresenceRefresher
+from app.utils.images import shutdown_pool as shutdown_image_pool
+from app.utils.static_files import UploadsStaticFiles
+from app.websocket import manager as chat_manager
 import os
 
-app = FastAPI()
+
+# ============================
+# Arranque: índices de Mongo + cola de correos + fan-out y presencia del chat
+# ============================
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await ensure_indexes()
+    email_dispatcher.start()
+    message_writer.start()
+    await chat_manager.start()
+    presence = PresenceRefresher(chat_manager)
+    presence.start()
+    yield
+    await presence.stop()
+    await chat_manager.stop()
+    # Guarda los mensajes de chat que siguen en cola (write-behind)
+    await message_writer.stop()
+    # Termina el lote en curso antes de apagar
+    await email_dispatcher.stop()
+    shutdown_image_pool()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # ============================
 # Directorio para uploads (Necesario para gaurdar imagenes)
@@ -16,12 +46,16 @@ app = FastAPI()
 os.makedirs("uploads", exist_ok=True)
 
 # Servir imágenes subidas (avatars, posts, etc.)
+# Cache-Control inmutable + ETag + Range, con métricas
 app.mount(
     "/uploads",
-    StaticFiles(directory="uploads"),
+    UploadsStaticFiles(directory="uploads"),
     name="uploads"
 )
 
+# Métricas Prometheus (caché, etc.)
+app.mount("/metrics", make_asgi_app())
+
 # ============================
 # ROOT
 # ============================
@@ -7,122 +7,275 @@ from fastapi import (
     HTTPException,
     Query,
 )
-from jose import jwt, JWTError
-from app.core.config import settings
-from app.core.auth import get_current_user
-from app.schemas.chat import ChatMessageResponse
-from app.services.chat import save_message, get_conversation, build_room_id
+from bson import ObjectId
+from jwt import PyJWTError
+from pymongo.errors import PyMongoError
+from app.core.auth import get_current_user, verify_token
+from app.schemas.chat import ChatMessageResponse, ChatMessagePage, ConversationResponse
+from app.services.chat import (
+    MessageTooLarge,
+    save_message,
+    get_conversation,
+    get_conversation_page,
+    get_messages_since,
+    message_event,
+    build_room_id,
+)
+from app.services.inbox import get_conversations, mark_read
+from app.services.presence import (
+    allow_typing,
+    is_online,
+    mark_offline,
+    mark_online,
+    presence_event,
+    typing_event,
+)
+from app.websocket import WS_MESSAGES, MuxChannel, MuxLink, manager, parse_control
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
+HISTORY_MAX_PAGE_SIZE = 100
+CONVERSATIONS_MAX = 100
+# Más que esto al reconectar: mejor recargar el historial por HTTP
+REPLAY_MAX_MESSAGES = 500
+
 
 # ------------------------------
 # 1) HISTORIAL DE MENSAJES (HTTP)
 # ------------------------------
-@router.get("/messages/{other_user_id}", response_model=list[ChatMessageResponse])
+@router.get(
+    "/messages/{other_user_id}",
+    response_model=list[ChatMessageResponse] | ChatMessagePage,
+)
 async def get_chat_messages(
     other_user_id: str,
+    limit: int | None = Query(None, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    before: str | None = Query(None),
+    after: str | None = Query(None),
     user_id: str = Depends(get_current_user),
 ):
-    messages = await get_conversation(user_id, other_user_id)
-    return messages
+    # Sin limit: historial completo (comportamiento original)
+    if limit is None:
+        return await get_conversation(user_id, other_user_id)
+
+    # Con limit: { "items": [...], "next_cursor": "<id>" | null }
+    if before and after:
+        raise HTTPException(status_code=400, detail="Usa before o after, no ambos")
+    cursor = before or after
+    if cursor and not ObjectId.is_valid(cursor):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+    page = await get_conversation_page(user_id, other_user_id, limit, before, after)
+    if page is None:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return page
 
 
 # ------------------------------
-# 2) MANEJADOR DE CONEXIONES WS
+# 1b) BANDEJA DE CONVERSACIONES
 # ------------------------------
-class ConnectionManager:
-    def __init__(self):
-        # room_id -> lista de websockets
-        self.active_connections: dict[str, list[WebSocket]] = {}
-
-    async def connect(self, room_id: str, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.setdefault(room_id, []).append(websocket)
+@router.get("/conversations", response_model=list[ConversationResponse])
+async def list_conversations(
+    limit: int = Query(50, ge=1, le=CONVERSATIONS_MAX),
+    user_id: str = Depends(get_current_user),
+):
+    return await get_conversations(user_id, limit)
 
-    def disconnect(self, room_id: str, websocket: WebSocket):
-        if room_id in self.active_connections:
-            if websocket in self.active_connections[room_id]:
-                self.active_connections[room_id].remove(websocket)
-            if not self.active_connections[room_id]:
-                del self.active_connections[room_id]
 
-    async def broadcast(self, room_id: str, message: dict):
-        for connection in self.active_connections.get(room_id, []):
-            await connection.send_json(message)
+@router.post("/conversations/{other_user_id}/read")
+async def read_conversation(
+    other_user_id: str,
+    user_id: str = Depends(get_current_user),
+):
+    room_id = await build_room_id(user_id, other_user_id)
+    await mark_read(user_id, room_id)
+    return {"message": "Conversación marcada como leída"}
 
 
-manager = ConnectionManager()
+# ------------------------------
+# 2) MANEJADOR DE CONEXIONES WS
+# ------------------------------
+# Vive en app/websocket.py: el broadcast pasa por el broker (varias réplicas)
 
 
 # ------------------------------
 # 3) UTILIDAD PARA DECODIFICAR TOKEN
 # ------------------------------
 def decode_token(token: str) -> str:
-    """Decodifica el JWT y devuelve el user_id (sub)."""
-    payload = jwt.decode(
-        token,
-        settings.SECRET_KEY,
-        algorithms=[settings.ALGORITHM],
-    )
-    user_id: str = payload.get("sub")
-    if not user_id:
-        raise JWTError("No sub in token")
-    return user_id
+    """Decodifica el JWT y devuelve el user_id (sub). Comparte caché con get_current_user."""
+    return verify_token(token)
+
+
+async def replay_missed(websocket: WebSocket, connection, room_id: str, since: str | None, since_seq: int | None):
+    """
+    Envía lo que el cliente se perdió desde `since_seq` / `since` y reanuda
+    la entrega en vivo. Si el hueco es muy grande (o el cursor no existe)
+    manda {"type": "resync"} y el cliente recarga el historial por HTTP.
+    """
+    last_seq = since_seq
+    try:
+        messages, complete = await get_messages_since(
+            room_id, since_id=since, since_seq=since_seq, limit=REPLAY_MAX_MESSAGES
+        )
+        if not complete:
+            await websocket.send_json({"type": "resync"})
+            return
+
+        for m in messages:
+            await websocket.send_json(message_event(m))
+            last_seq = m.get("seq") or last_seq
+    finally:
+        connection.resume(after_seq=last_seq)
+
+
+async def announce_online(connection, other_user_id: str):
+    """Marca al usuario en línea, avisa a la sala y le manda el estado del otro."""
+    try:
+        if len(manager.user_connections(connection.user_id)) == 1:
+            await mark_online([connection.user_id])
+        connection.enqueue(presence_event(other_user_id, await is_online(other_user_id)))
+    except PyMongoError as e:
+        print(f"❌ Error de presencia: {e}")
+    await manager.broadcast(connection.room_id, presence_event(connection.user_id, True))
+
+
+async def announce_offline(connection):
+    """Si era su último socket (en cualquier réplica), avisa a la sala que se desconectó."""
+    if manager.user_connections(connection.user_id):
+        return
+    try:
+        await mark_offline(connection.user_id)
+        if not await is_online(connection.user_id):
+            await manager.broadcast(connection.room_id, presence_event(connection.user_id, False))
+    except PyMongoError as e:
+        print(f"❌ Error de presencia: {e}")
 
 
 # ------------------------------
 # 4) WEBSOCKET DE CHAT
 # ------------------------------
-@router.websocket("/ws/{other_user_id}")
-async def websocket_chat(
-    websocket: WebSocket,
+async def chat_session(
+    websocket,
+    token: str | None,
     other_user_id: str,
-    token: str | None = Query(default=None),  # opcional: ?token=
+    since: str | None = None,
+    since_seq: int | None = None,
 ):
-    # 1) Intentar leer token de query; si no, de cookie
-    if not token:
-        token = websocket.cookies.get("access_token")
-
+    """
+    Atiende un chat: un WebSocket directo o un canal del enlace
+    multiplexado del frontend (app.websocket.MuxChannel).
+    """
     if not token:
         await websocket.close(code=1008)  # Policy Violation
         return
 
-    # 2) Decodificar user_id
+    # 1) Decodificar user_id
     try:
         user_id = decode_token(token)
-    except JWTError:
+    except PyJWTError:
         await websocket.close(code=1008)
         return
 
-    # 3) Construir room_id
+    # 2) Construir room_id
     room_id = await build_room_id(user_id, other_user_id)
 
-    # 4) Conectar
-    await manager.connect(room_id, websocket)
+    # 3) Conectar (en pausa si hay que reponer mensajes: lo que llegue en
+    #    vivo mientras tanto se envía después, sin duplicar)
+    resuming = since is not None or since_seq is not None
+    connection = await manager.connect(room_id, websocket, user_id, paused=resuming)
 
     try:
+        await announce_online(connection, other_user_id)
+
+        if resuming:
+            await replay_missed(websocket, connection, room_id, since, since_seq)
+
         while True:
             text = await websocket.receive_text()
+            connection.touch()
+
+            # Control: ping (mantiene viva la conexión) / typing (no se guarda)
+            control = parse_control(text)
+            if control is not None:
+                if control["type"] == "ping":
+                    connection.enqueue({"type": "pong"})
+                elif allow_typing(connection):
+                    await manager.broadcast(room_id, typing_event(user_id))
+                continue
+            WS_MESSAGES.labels("in").inc()
 
             # Guardar en BD
-            doc = await save_message(user_id, other_user_id, text)
+            try:
+                doc = await save_message(user_id, other_user_id, text)
+            except MessageTooLarge as e:
+                connection.enqueue({"type": "error", "detail": str(e)})
+                continue
 
             # Broadcast a todos en el room
-            await manager.broadcast(
-                room_id,
-                {
-                    "id": doc["id"],
-                    "sender_id": doc["sender_id"],
-                    "receiver_id": doc["receiver_id"],
-                    "content": doc["content"],
-                    "timestamp": doc["timestamp"].isoformat(),
-                },
-            )
+            await manager.broadcast(room_id, message_event(doc))
 
     except WebSocketDisconnect:
-        manager.disconnect(room_id, websocket)
+        pass
     except Exception:
-        manager.disconnect(room_id, websocket)
-        await websocket.close()
+        manager.disconnect(connection)
+        try:
+            await websocket.close()
+        except RuntimeError:
+            pass  # el manager ya lo cerró (cliente lento)
+    finally:
+        # También con CancelledError (apagado, enlace mux caído): si no, el
+        # socket queda en el registro y announce_offline lo ve conectado
+        manager.disconnect(connection)
+        await announce_offline(connection)
+
+
+@router.websocket("/ws/{other_user_id}")
+async def websocket_chat(
+    websocket: WebSocket,
+    other_user_id: str,
+    token: str | None = Query(default=None),  # opcional: ?token=
+    # Reconexión: reponer solo lo posterior al último mensaje visto
+    since: str | None = Query(default=None),
+    since_seq: int | None = Query(default=None, ge=0),
+):
+    # Token de query; si no, de cookie
+    await chat_session(
+        websocket,
+        token or websocket.cookies.get("access_token"),
+        other_user_id,
+        since,
+        since_seq,
+    )
+
+
+# ------------------------------
+# 5) ENLACE MULTIPLEXADO DEL FRONTEND
+# ------------------------------
+async def serve_mux_channel(channel: MuxChannel, frame: dict):
+    since = frame.get("since")
+    since_seq = frame.get("since_seq")
+    if not isinstance(since_seq, int) or since_seq < 0:
+        since_seq = None
+    try:
+        await chat_session(
+            channel,
+            frame.get("token"),
+            str(frame.get("other", "")),
+            since if isinstance(since, str) else None,
+            since_seq,
+        )
+    finally:
+        # Terminó sin que nadie cerrara el canal (error antes de conectar)
+        if not channel.closed:
+            await channel.close(code=1011)
+
 
+@router.websocket("/mux")
+async def websocket_mux(websocket: WebSocket):
+    """
+    Un solo WebSocket por worker del frontend con todos sus chats adentro
+    (ver MuxLink). Cada canal trae el JWT de su usuario y se valida igual
+    que en /chat/ws.
+    """
+    await websocket.accept()
+    await MuxLink(websocket, serve_mux_channel).serve()
@@ -1,22 +1,28 @@
 #routers/post.py
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Form, Request
+from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Form, Request, Query, BackgroundTasks
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 from app.core.auth import get_current_user
+from app.core.etag import etag_response
+from app.utils.storage import release_unused_upload, save_upload_file, upload_url
 from app.services.posts import (
     create_post,
     get_post_by_id,
     get_posts_feed,
+    get_posts_feed_page,
     get_user_posts,
     update_post,
-    delete_post
+    delete_post,
+    build_post_image_variants
 )
-import shutil
-import uuid
+from bson import ObjectId
 
 router = APIRouter(prefix="/posts", tags=["Posts"])
 templates = Jinja2Templates(directory="app/templates")
 
+# Tamaño máximo de página para el feed paginado
+FEED_MAX_PAGE_SIZE = 50
+
 
 
 
@@ -26,6 +32,7 @@ templates = Jinja2Templates(directory="app/templates")
 # ============================
 @router.post("/")
 async def create_new_post(
+    background_tasks: BackgroundTasks,
     title: str = Form(...),
     description: str = Form(...),
     details: str = Form(None),
@@ -33,16 +40,11 @@ async def create_new_post(
     user_id: str = Depends(get_current_user)
 ):
     image_url = None
+    stored = None
 
     if file:
-        ext = file.filename.split(".")[-1]
-        unique_name = f"{uuid.uuid4()}.{ext}"
-        file_path = f"uploads/{unique_name}"
-
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-
-        image_url = f"http://localhost:8000/uploads/{unique_name}"
+        stored = await save_upload_file(file)
+        image_url = upload_url(stored.filename)
 
     data = {
         "title": title,
@@ -52,7 +54,16 @@ async def create_new_post(
         "user_id": user_id,
     }
 
-    post = await create_post(data)
+    try:
+        post = await create_post(data)
+    except BaseException:
+        # La imagen ya sumó una referencia al blob: sin post, se devuelve
+        await release_unused_upload(stored)
+        raise
+
+    # Thumbnails/WebP después de responder
+    if stored:
+        background_tasks.add_task(build_post_image_variants, post["id"], stored.filename, image_url)
     
     # Convertir ObjectId a str para evitar errores de serialización
     if post and "_id" in post:
@@ -76,9 +87,23 @@ def serialize_posts_list(posts):
 # FEED
 # ============================
 @router.get("/feed/all")
-async def feed_posts():
-    posts = await get_posts_feed()
-    return serialize_posts_list(posts)
+async def feed_posts(
+    request: Request,
+    limit: int | None = Query(None, ge=1, le=FEED_MAX_PAGE_SIZE),
+    before: str | None = Query(None)
+):
+    # Sin limit: feed completo (comportamiento original).
+    # Los posts del feed ya vienen con "id" (sin "_id"), no hace falta serializar.
+    if limit is None:
+        posts = await get_posts_feed()
+        return etag_response(request, posts, memo=True)
+
+    # Con limit: { "items": [...], "next_cursor": "<_id>" | null }
+    if before and not ObjectId.is_valid(before):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+    page = await get_posts_feed_page(limit, before)
+    return etag_response(request, page, memo=True)
 
 
 # ============================
@@ -94,11 +119,11 @@ async def my_posts(user_id: str = Depends(get_current_user)):
 # POST POR ID (SIEMPRE AL FINAL)
 # ============================
 @router.get("/{post_id}")
-async def get_post(post_id: str):
+async def get_post(post_id: str, request: Request):
     post = await get_post_by_id(post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Publicación no encontrada")
-    return serialize_post(post)
+    return etag_response(request, serialize_post(post), memo=True)
 
 
 # ============================
@@ -107,6 +132,7 @@ async def get_post(post_id: str):
 @router.put("/{post_id}")
 async def update_existing_post(
     post_id: str,
+    background_tasks: BackgroundTasks,
     title: str = Form(None),
     description: str = Form(None),
     details: str = Form(None),
@@ -122,20 +148,25 @@ async def update_existing_post(
     if details:
         update_data["details"] = details
 
+    stored = None
     if file:
-        ext = file.filename.split(".")[-1]
-        unique_name = f"{uuid.uuid4()}.{ext}"
-        file_path = f"uploads/{unique_name}"
-
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-
-        update_data["image_url"] = f"http://localhost:8000/uploads/{unique_name}"
-
-    updated = await update_post(post_id, update_data, user_id)
-
-    if not updated:
-        raise HTTPException(status_code=404, detail="No autorizado")
+        stored = await save_upload_file(file)
+        update_data["image_url"] = upload_url(stored.filename)
+        # Las variantes de la imagen anterior ya no sirven
+        update_data["image_variants"] = {}
+
+    try:
+        updated = await update_post(post_id, update_data, user_id)
+
+        if not updated:
+            raise HTTPException(status_code=404, detail="No autorizado")
+    except BaseException:
+        # La imagen nueva ya sumó una referencia al blob: si no se usa, se devuelve
+        await release_unused_upload(stored)
+        raise
+
+    if stored:
+        background_tasks.add_task(build_post_image_variants, post_id, stored.filename, update_data["image_url"])
 
     return {"message": "Publicación actualizada"}
 
@@ -1,8 +1,6 @@
 #routers/user.py
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Body
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Body, Request, BackgroundTasks
 from bson import ObjectId
-import uuid
-import shutil
 from fastapi import Form
 from pydantic import BaseModel, EmailStr
 
@@ -14,9 +12,12 @@ from app.services.users import (
     verify_email_code,
     resend_verification_code,
     request_password_reset,
-    reset_password
+    reset_password,
+    build_profile_image_variants
 )
 from app.core.auth import get_current_user
+from app.core.etag import etag_response
+from app.utils.storage import release_unused_upload, save_upload_file, upload_url
 from app.db.init_db import db
 
 
@@ -42,12 +43,14 @@ class PasswordResetConfirm(BaseModel):
 # ============================
 @router.post("/register", response_model=UserResponse)
 async def register_user(
+    background_tasks: BackgroundTasks,
     name: str = Form(...),
     email: str = Form(...),
     password: str = Form(...),
     file: UploadFile | None = File(None)
 ):
     profile_image_url = None
+    stored = None
 
     if file:
         if not file.content_type.startswith("image/"):
@@ -56,28 +59,31 @@ async def register_user(
                 detail="El archivo debe ser una imagen"
             )
 
-        ext = file.filename.split(".")[-1]
-        filename = f"{uuid.uuid4()}.{ext}"
-        file_path = f"uploads/{filename}"
+        stored = await save_upload_file(file)
+        profile_image_url = upload_url(stored.filename)
 
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-
-        profile_image_url = f"http://localhost:8000/uploads/{filename}"
+    try:
+        user_data = UserRegister(
+            name=name,
+            email=email,
+            password=password
+        )
 
-    user_data = UserRegister(
-        name=name,
-        email=email,
-        password=password
-    )
+        user = await create_user(user_data, profile_image_url)
 
-    user = await create_user(user_data, profile_image_url)
+        if not user:
+            raise HTTPException(
+                status_code=400,
+                detail="El usuario ya existe"
+            )
+    except BaseException:
+        # El avatar ya sumó una referencia al blob: si no hay usuario, se devuelve
+        await release_unused_upload(stored)
+        raise
 
-    if not user:
-        raise HTTPException(
-            status_code=400,
-            detail="El usuario ya existe"
-        )
+    # Thumbnails/WebP del avatar después de responder
+    if stored:
+        background_tasks.add_task(build_profile_image_variants, user["id"], stored.filename, profile_image_url)
 
     return user
 
@@ -161,17 +167,20 @@ async def confirm_reset(data: PasswordResetConfirm):
 # USUARIO ACTUAL
 # ============================
 @router.get("/me")
-async def get_me(user_id: str = Depends(get_current_user)):
+async def get_me(request: Request, user_id: str = Depends(get_current_user)):
     user = await db.users.find_one({"_id": ObjectId(user_id)})
     if not user:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
 
-    return {
+    data = {
         "id": str(user["_id"]),
         "name": user["name"],
         "email": user["email"],
-        "profile_image": user.get("profile_image")
+        "profile_image": user.get("profile_image"),
+        "profile_image_variants": user.get("profile_image_variants")
     }
+    # private: es información del usuario, no debe guardarse en cachés compartidas
+    return etag_response(request, data, cache_control="private, no-cache")
 
 
 # ============================
@@ -179,6 +188,7 @@ async def get_me(user_id: str = Depends(get_current_user)):
 # ============================
 @router.post("/upload-avatar")
 async def upload_avatar(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     user_id: str = Depends(get_current_user)
 ):
@@ -189,16 +199,15 @@ async def upload_avatar(
             detail="El archivo debe ser una imagen"
         )
 
-    ext = file.filename.split(".")[-1]
-    filename = f"{uuid.uuid4()}.{ext}"
-    file_path = f"uploads/{filename}"
-
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-
-    image_url = f"http://localhost:8000/uploads/{filename}"
+    stored = await save_upload_file(file)
+    image_url = upload_url(stored.filename)
 
-    await update_profile_image(user_id, image_url)
+    try:
+        await update_profile_image(user_id, image_url)
+    except BaseException:
+        await release_unused_upload(stored)
+        raise
+    background_tasks.add_task(build_profile_image_variants, user_id, stored.filename, image_url)
 
     return {
         "profile_image": image_url
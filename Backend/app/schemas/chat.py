@@ -4,7 +4,30 @@ from datetime import datetime
 
 class ChatMessageResponse(BaseModel):
     id: str
+    seq: int | None = None
     sender_id: str
     receiver_id: str
     content: str
     timestamp: datetime
+
+
+class ChatMessagePage(BaseModel):
+    items: list[ChatMessageResponse]
+    next_cursor: str | None = None
+
+
+class LastMessage(BaseModel):
+    id: str
+    sender_id: str
+    content: str
+    timestamp: datetime
+
+
+class ConversationResponse(BaseModel):
+    room_id: str
+    other_user_id: str
+    other_user_name: str | None = None
+    other_user_profile_image: str | None = None
+    last_message: LastMessage
+    unread: int
+    updated_at: datetime
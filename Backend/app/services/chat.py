@@ -1,27 +1,90 @@
 #services/chat.py
 from datetime import datetime
 from typing import List, Dict, Any
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+from app.core.config import settings
 from app.db.init_db import db
+from app.services.chat_writer import writer as message_writer
+from app.services.inbox import update_inbox
 
 async def build_room_id(user_a: str, user_b: str) -> str:
     # Siempre el mismo orden, para que el mismo par de usuarios tenga el mismo room_id
     return "_".join(sorted([user_a, user_b]))
 
 
+async def next_room_seq(room_id: str) -> int:
+    """
+    Número de secuencia siguiente de la sala (1, 2, 3...), compartido entre
+    réplicas. Es un $inc por mensaje también con write-behind: reservar
+    bloques por proceso rompería el orden entre réplicas (un mensaje nuevo
+    de una réplica podría tener seq menor que uno viejo de otra) y
+    ?since_seq= se lo saltaría al reponer.
+    """
+    counter = await db.room_counters.find_one_and_update(
+        {"_id": room_id},
+        {"$inc": {"seq": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return counter["seq"]
+
+
+class MessageTooLarge(ValueError):
+    """El texto supera CHAT_MAX_MESSAGE_BYTES: no se guarda ni se difunde."""
+
+
 async def save_message(sender_id: str, receiver_id: str, content: str) -> Dict[str, Any]:
+    # Antes de gastar un seq: un documento que Mongo no acepta nunca se guardaría
+    if len(content.encode("utf-8")) > settings.CHAT_MAX_MESSAGE_BYTES:
+        raise MessageTooLarge(f"El mensaje supera {settings.CHAT_MAX_MESSAGE_BYTES} bytes")
+
     room_id = await build_room_id(sender_id, receiver_id)
 
+    # _id y seq asignados aquí: el mensaje tiene id antes de llegar a Mongo
     doc = {
+        "_id": ObjectId(),
         "room_id": room_id,
+        "seq": await next_room_seq(room_id),
         "sender_id": sender_id,
         "receiver_id": receiver_id,
         "content": content,
         "timestamp": datetime.utcnow(),
     }
 
-    result = await db.messages.insert_one(doc)
-    doc["id"] = str(result.inserted_id)
-    return doc
+    # Write-behind: se guarda en el próximo insert_many (services/chat_writer.py).
+    # Con la cola llena (Mongo lento/caído) se vuelve a la escritura directa.
+    if settings.CHAT_WRITE_BEHIND and not message_writer.full:
+        message_writer.enqueue(doc)
+    else:
+        await db.messages.insert_one(doc)
+        try:
+            await update_inbox([doc])
+        except PyMongoError as e:
+            # El mensaje ya está guardado; la bandeja se rehace con scripts/backfill_inbox.py
+            print(f"❌ Error actualizando la bandeja de chat: {e}")
+
+    return {**doc, "id": str(doc["_id"])}
+
+
+def _serialize_message(m: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": str(m["_id"]),
+        # Los mensajes anteriores a los números de secuencia no tienen seq
+        "seq": m.get("seq"),
+        "sender_id": m["sender_id"],
+        "receiver_id": m["receiver_id"],
+        "content": m["content"],
+        "timestamp": m["timestamp"],
+    }
+
+
+def message_event(m: Dict[str, Any]) -> Dict[str, Any]:
+    """Mensaje tal como viaja por el WebSocket (timestamp en ISO)."""
+    event = _serialize_message(m)
+    event["timestamp"] = m["timestamp"].isoformat()
+    return event
 
 
 async def get_conversation(user_id: str, other_user_id: str) -> List[Dict[str, Any]]:
@@ -31,13 +94,134 @@ async def get_conversation(user_id: str, other_user_id: str) -> List[Dict[str, A
 
     messages: List[Dict[str, Any]] = []
     async for m in cursor:
-        messages.append(
-            {
-                "id": str(m["_id"]),
-                "sender_id": m["sender_id"],
-                "receiver_id": m["receiver_id"],
-                "content": m["content"],
-                "timestamp": m["timestamp"],
-            }
-        )
+        messages.append(_serialize_message(m))
     return messages
+
+
+async def _cursor_filter(room_id: str, message_id: str, op: str) -> Dict[str, Any] | None:
+    """
+    Filtro "antes/después de este mensaje" sobre el orden (timestamp, _id).
+    None si el mensaje no existe en esa sala.
+    """
+    ref = await db.messages.find_one(
+        {"_id": ObjectId(message_id), "room_id": room_id},
+        {"timestamp": 1},
+    )
+    if not ref:
+        return None
+
+    return {"$or": [
+        {"timestamp": {op: ref["timestamp"]}},
+        {"timestamp": ref["timestamp"], "_id": {op: ref["_id"]}},
+    ]}
+
+
+async def get_conversation_page(
+    user_id: str,
+    other_user_id: str,
+    limit: int,
+    before: str | None = None,
+    after: str | None = None,
+) -> Dict[str, Any] | None:
+    """
+    Una página de la conversación, siempre en orden ascendente.
+
+    - sin cursor: los `limit` mensajes más recientes
+    - before=<id>: los `limit` anteriores a ese mensaje (scroll hacia arriba)
+    - after=<id>: los `limit` siguientes (ponerse al día)
+
+    next_cursor es el id a pasar en el mismo parámetro para seguir en esa
+    dirección (None si no quedan). Devuelve None si el cursor no es de la sala.
+    """
+    room_id = await build_room_id(user_id, other_user_id)
+    query: Dict[str, Any] = {"room_id": room_id}
+
+    if before or after:
+        cursor_filter = await _cursor_filter(room_id, before or after, "$lt" if before else "$gt")
+        if cursor_filter is None:
+            return None
+        query.update(cursor_filter)
+
+    # Hacia atrás se lee descendente y se da vuelta; se pide uno de más para saber si hay otra página
+    direction = 1 if after else -1
+    cursor = (
+        db.messages.find(query)
+        .sort([("timestamp", direction), ("_id", direction)])
+        .limit(limit + 1)
+    )
+    messages = [_serialize_message(m) async for m in cursor]
+
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    if direction == -1:
+        messages.reverse()
+
+    next_cursor = None
+    if has_more:
+        next_cursor = messages[-1]["id"] if after else messages[0]["id"]
+
+    return {"items": messages, "next_cursor": next_cursor}
+
+
+async def get_messages_since(
+    room_id: str,
+    since_id: str | None = None,
+    since_seq: int | None = None,
+    limit: int = 500,
+) -> tuple[List[Dict[str, Any]], bool]:
+    """
+    Mensajes de la sala posteriores a `since_seq` (o al mensaje `since_id`),
+    en orden, para reponer lo perdido al reconectar el WebSocket.
+
+    Devuelve (mensajes, completo). completo=False si el hueco supera `limit`
+    o el cursor no sirve: el cliente debe recargar el historial por HTTP.
+    """
+    if since_seq is None:
+        ref = None
+        if ObjectId.is_valid(since_id or ""):
+            ref = await db.messages.find_one(
+                {"_id": ObjectId(since_id), "room_id": room_id},
+                {"seq": 1, "timestamp": 1},
+            )
+        if not ref:
+            return [], False
+        since_seq = ref.get("seq")
+
+    if since_seq is not None:
+        query: Dict[str, Any] = {"room_id": room_id, "seq": {"$gt": since_seq}}
+        sort = [("seq", 1)]
+
+        def key(m):
+            return m["seq"]
+
+        def is_after(m):
+            return m["seq"] > since_seq
+    else:
+        # Mensaje anterior a los números de secuencia: orden (timestamp, _id)
+        query = {"room_id": room_id, "$or": [
+            {"timestamp": {"$gt": ref["timestamp"]}},
+            {"timestamp": ref["timestamp"], "_id": {"$gt": ref["_id"]}},
+        ]}
+        sort = [("timestamp", 1), ("_id", 1)]
+
+        def key(m):
+            return (m["timestamp"], m["_id"])
+
+        def is_after(m):
+            return key(m) > (ref["timestamp"], ref["_id"])
+
+    cursor = db.messages.find(query).sort(sort).limit(limit + 1)
+    messages = [m async for m in cursor]
+
+    # Write-behind: lo que aún no llegó a Mongo en este proceso. Puede tener
+    # seq menor que lo ya guardado (otro mensaje se guardó antes), así que
+    # se ordena todo junto antes de cortar en `limit`
+    seen = {m["_id"] for m in messages}
+    messages += [
+        m for m in message_writer.pending(room_id)
+        if m["_id"] not in seen and is_after(m)
+    ]
+    messages.sort(key=key)
+
+    complete = len(messages) <= limit
+    return messages[:limit], complete
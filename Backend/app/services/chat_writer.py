@@ -0,0 +1,181 @@
+#services/chat_writer.py
+"""
+Escritura diferida (write-behind) de mensajes de chat.
+
+Con CHAT_WRITE_BEHIND=true, save_message() asigna el _id en el servidor,
+encola el documento y vuelve enseguida: el mensaje se difunde sin esperar
+el insert ni la bandeja (solo el $inc del seq de la sala, ver
+services/chat.py next_room_seq). El MessageWriter (arrancado en el lifespan) junta lo encolado en
+ventanas de CHAT_FLUSH_INTERVAL_MS / CHAT_FLUSH_MAX_BATCH y lo guarda con
+un solo insert_many (y la bandeja, con un bulk_write). Al apagar, stop()
+vacía la cola antes de salir, con un tope de
+CHAT_WRITE_BEHIND_STOP_TIMEOUT_SECONDS si Mongo no responde.
+
+Un mensaje recién enviado puede tardar esa ventana en aparecer en el
+historial HTTP. Si el proceso muere sin apagado ordenado (SIGKILL, OOM)
+se pierde lo que estaba en cola. Un documento que Mongo nunca va a
+aceptar (demasiado grande, inválido) se descarta en vez de reintentarse
+para siempre (adoppets_chat_write_poison_total).
+"""
+import asyncio
+from typing import Any, Dict, List
+
+import bson
+from bson.errors import InvalidDocument
+from prometheus_client import Counter, Gauge, Histogram
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from app.core.config import settings
+from app.db.init_db import db
+from app.services.inbox import update_inbox
+
+# Código de Mongo para _id duplicado: en un reintento, ese mensaje ya se guardó
+DUPLICATE_KEY = 11000
+# Errores por documento que pueden salir bien al reintentar (cambio de
+# primario, apagado, red); cualquier otro (validación, tamaño...) es permanente
+TRANSIENT_CODES = {6, 7, 64, 89, 91, 189, 262, 9001, 10107, 11600, 11602, 13435, 13436}
+MAX_RETRY_DELAY_SECONDS = 5
+# Tope de Mongo por documento
+MAX_BSON_SIZE = 16 * 1024 * 1024
+
+CHAT_PENDING = Gauge("adoppets_chat_write_pending", "Mensajes de chat en cola sin guardar")
+CHAT_BATCH_SIZE = Histogram(
+    "adoppets_chat_write_batch_size",
+    "Mensajes por insert_many",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 200, 500),
+)
+CHAT_FLUSH_ERRORS = Counter("adoppets_chat_write_errors_total", "insert_many fallidos (se reintentan)")
+CHAT_DROPPED = Counter("adoppets_chat_write_dropped_total", "Mensajes de chat descartados al apagar sin poder guardarlos")
+CHAT_POISON = Counter("adoppets_chat_write_poison_total", "Mensajes de chat descartados porque Mongo nunca los aceptaría")
+
+
+class MessageWriter:
+    def __init__(self):
+        self._pending: List[Dict[str, Any]] = []
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+
+    @property
+    def full(self) -> bool:
+        return len(self._pending) >= settings.CHAT_WRITE_BEHIND_MAX_PENDING
+
+    def start(self):
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Guarda lo pendiente (reintentando, como mucho CHAT_WRITE_BEHIND_STOP_TIMEOUT_SECONDS) y termina."""
+        self._stopping = True
+        self._wakeup.set()
+        if self._task:
+            try:
+                await asyncio.wait_for(self._task, settings.CHAT_WRITE_BEHIND_STOP_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                # Mongo sigue caído: no se bloquea el apagado para siempre
+                print(f"❌ Apagado sin poder guardar {len(self._pending)} mensajes de chat")
+                CHAT_DROPPED.inc(len(self._pending))
+                self._pending.clear()
+                CHAT_PENDING.set(0)
+            self._task = None
+
+    def pending(self, room_id: str) -> List[Dict[str, Any]]:
+        """Mensajes de la sala que todavía no se guardaron (en orden)."""
+        return [doc for doc in self._pending if doc["room_id"] == room_id]
+
+    def enqueue(self, doc: Dict[str, Any]):
+        self._pending.append(doc)
+        CHAT_PENDING.set(len(self._pending))
+        self._wakeup.set()
+
+    async def _run(self):
+        delay = 0.0
+        while True:
+            if not self._pending:
+                if self._stopping:
+                    return
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+
+            # Ventana corta para juntar más mensajes en el mismo insert
+            if not self._stopping and len(self._pending) < settings.CHAT_FLUSH_MAX_BATCH:
+                await asyncio.sleep(settings.CHAT_FLUSH_INTERVAL_MS / 1000)
+
+            try:
+                if await self.flush_batch():
+                    delay = 0.0
+                    continue
+            except Exception as e:
+                # Un error inesperado no puede matar al writer: la cola se quedaría sin guardar
+                CHAT_FLUSH_ERRORS.inc()
+                print(f"❌ Error inesperado guardando mensajes de chat: {e!r}")
+
+            # Mongo caído: se reintenta con backoff, sin perder la cola
+            delay = min(max(delay * 2, 0.1), MAX_RETRY_DELAY_SECONDS)
+            await asyncio.sleep(delay)
+
+    async def flush_batch(self) -> bool:
+        batch = self._pending[:settings.CHAT_FLUSH_MAX_BATCH]
+        if not batch:
+            return True
+
+        failed: set[int] = set()
+        poison: set[int] = set()
+        try:
+            await db.messages.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            # Duplicados = ya estaban guardados de un intento anterior
+            for err in e.details.get("writeErrors", []):
+                if err.get("code") in TRANSIENT_CODES:
+                    failed.add(err["index"])
+                elif err.get("code") != DUPLICATE_KEY:
+                    poison.add(err["index"])
+            if failed:
+                CHAT_FLUSH_ERRORS.inc()
+                print(f"❌ Error guardando {len(failed)} mensajes de chat: {e}")
+        except InvalidDocument:
+            # Incluye DocumentTooLarge: falla al codificar, antes de enviar nada
+            poison = _unencodable(batch) or set(range(len(batch)))
+            failed = set(range(len(batch))) - poison
+        except PyMongoError as e:
+            # No se sabe qué llegó a guardarse: se reintenta el lote entero
+            CHAT_FLUSH_ERRORS.inc()
+            print(f"❌ Error guardando mensajes de chat: {e}")
+            return False
+
+        if poison:
+            CHAT_POISON.inc(len(poison))
+            print(f"❌ Descartados {len(poison)} mensajes de chat que Mongo no acepta: "
+                  f"{[str(batch[i]['_id']) for i in sorted(poison)]}")
+
+        # Solo los fallidos vuelven a la cola (adelante, en orden)
+        saved = [doc for i, doc in enumerate(batch) if i not in failed and i not in poison]
+        self._pending[:len(batch)] = [batch[i] for i in sorted(failed)]
+        CHAT_PENDING.set(len(self._pending))
+        CHAT_BATCH_SIZE.observe(len(batch))
+
+        # La bandeja se actualiza una sola vez por mensaje, con los que ya
+        # están en `messages` (un duplicado viene de un intento cuyo resultado
+        # no se supo, y ahí la bandeja no se tocó). Si falla no se reintenta
+        # (duplicaría los no leídos); scripts/backfill_inbox.py la rehace
+        try:
+            await update_inbox(saved)
+        except PyMongoError as e:
+            print(f"❌ Error actualizando la bandeja de chat: {e}")
+        return not failed
+
+
+def _unencodable(batch: List[Dict[str, Any]]) -> set[int]:
+    """Índices del lote que no se pueden codificar o superan el máximo de BSON."""
+    bad = set()
+    for i, doc in enumerate(batch):
+        try:
+            if len(bson.encode(doc)) > MAX_BSON_SIZE:
+                bad.add(i)
+        except InvalidDocument:
+            bad.add(i)
+    return bad
+
+
+writer = MessageWriter()
@@ -0,0 +1,170 @@
+#services/email_outbox.py
+"""
+Cola de correos persistida en Mongo (colección email_outbox).
+
+Los handlers solo llaman a enqueue_email() y responden; el EmailDispatcher
+(arrancado en el lifespan) envía en lotes por una sesión SMTP reutilizada y
+reintenta con backoff exponencial. Varias réplicas pueden correr el
+dispatcher a la vez: cada job se reclama con find_one_and_update.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+from pymongo import ReturnDocument, UpdateOne
+
+from app.core.config import settings
+from app.core.email_utils import build_message, get_mailer
+from app.db.init_db import db
+
+# Un job en "sending" cuyo lock venció (p. ej. el pod murió) vuelve a enviarse
+SEND_LOCK_SECONDS = 120
+# Sin correos durante este tiempo se cierra la sesión SMTP
+SMTP_IDLE_SECONDS = 60
+# Sondeo de respaldo (otras réplicas pueden encolar sin despertarnos)
+POLL_SECONDS = 5
+MAX_RETRY_DELAY_SECONDS = 3600
+
+
+async def enqueue_email(
+    to: str,
+    subject: str,
+    html: str | None = None,
+    text: str | None = None,
+) -> str:
+    now = datetime.utcnow()
+    result = await db.email_outbox.insert_one({
+        "to": to,
+        "subject": subject,
+        "html": html,
+        "text": text,
+        "status": "pending",  # pending -> sending -> sent | failed
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now,
+        "last_error": None,
+    })
+    dispatcher.wake()
+    return str(result.inserted_id)
+
+
+def retry_delay(attempts: int) -> float:
+    return min(settings.EMAIL_RETRY_BASE_SECONDS * 2 ** (attempts - 1), MAX_RETRY_DELAY_SECONDS)
+
+
+class EmailDispatcher:
+    def __init__(self):
+        self._mailer = get_mailer()
+        # Un solo hilo: la sesión SMTP es bloqueante y no es thread-safe
+        self._smtp_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="smtp")
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+        self._last_send = 0.0
+
+    def start(self):
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Termina el lote en curso y cierra la sesión SMTP."""
+        self._stopping = True
+        self._wakeup.set()
+        if self._task:
+            await self._task
+            self._task = None
+        await self._in_smtp_thread(self._mailer.close)
+
+    def wake(self):
+        self._wakeup.set()
+
+    async def _in_smtp_thread(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._smtp_thread, fn, *args)
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                if await self.dispatch_batch():
+                    continue  # puede haber más pendientes
+            except Exception as e:
+                # Mongo caído, etc.: se reintenta en el siguiente ciclo
+                print(f"❌ Error en el dispatcher de correos: {e}")
+
+            if self._mailer.connected and time.monotonic() - self._last_send > SMTP_IDLE_SECONDS:
+                await self._in_smtp_thread(self._mailer.close)
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _claim_batch(self) -> List[Dict[str, Any]]:
+        jobs = []
+        now = datetime.utcnow()
+        for _ in range(settings.EMAIL_BATCH_SIZE):
+            job = await db.email_outbox.find_one_and_update(
+                {"status": {"$in": ["pending", "sending"]}, "next_attempt_at": {"$lte": now}},
+                {"$set": {
+                    "status": "sending",
+                    "next_attempt_at": now + timedelta(seconds=SEND_LOCK_SECONDS),
+                }},
+                sort=[("next_attempt_at", 1)],
+                return_document=ReturnDocument.AFTER,
+            )
+            if not job:
+                break
+            jobs.append(job)
+        return jobs
+
+    def _send_batch(self, jobs: List[Dict[str, Any]]) -> List[str | None]:
+        """Corre en el hilo SMTP. Devuelve el error de cada job (None = enviado)."""
+        errors = []
+        for job in jobs:
+            try:
+                self._mailer.send(build_message(job["to"], job["subject"], job.get("html"), job.get("text")))
+                errors.append(None)
+            except Exception as e:
+                # Descartar la sesión: el siguiente correo reconecta
+                self._mailer.close()
+                errors.append(str(e))
+        return errors
+
+    async def dispatch_batch(self) -> bool:
+        jobs = await self._claim_batch()
+        if not jobs:
+            return False
+
+        errors = await self._in_smtp_thread(self._send_batch, jobs)
+        self._last_send = time.monotonic()
+
+        now = datetime.utcnow()
+        updates = []
+        for job, error in zip(jobs, errors):
+            if error is None:
+                updates.append(UpdateOne(
+                    {"_id": job["_id"]},
+                    {"$set": {"status": "sent", "sent_at": now, "last_error": None}},
+                ))
+                continue
+
+            attempts = job["attempts"] + 1
+            failed = attempts >= settings.EMAIL_MAX_ATTEMPTS
+            updates.append(UpdateOne(
+                {"_id": job["_id"]},
+                {"$set": {
+                    "status": "failed" if failed else "pending",
+                    "attempts": attempts,
+                    "last_error": error,
+                    "next_attempt_at": now + timedelta(seconds=retry_delay(attempts)),
+                }},
+            ))
+            print(f"❌ Error enviando correo a {job['to']} (intento {attempts}): {error}")
+
+        await db.email_outbox.bulk_write(updates, ordered=False)
+        return True
+
+
+dispatcher = EmailDispatcher()
@@ -0,0 +1,110 @@
+#services/inbox.py
+"""
+Bandeja de conversaciones materializada (colección inbox).
+
+Un documento por (user_id, room_id) con el último mensaje y los no leídos.
+Se actualiza en cada save_message (o en cada lote del write-behind), así
+que GET /chat/conversations es un solo find indexado por usuario en vez
+de recorrer `messages`.
+"""
+from datetime import datetime
+from typing import Any, Dict, List
+
+from pymongo import UpdateOne
+
+from app.db.init_db import db
+from app.services.posts import get_authors
+
+
+def inbox_updates(messages: List[Dict[str, Any]]) -> List[UpdateOne]:
+    """
+    Upserts de la bandeja para un lote de mensajes (en orden): por cada
+    (usuario, sala) queda el último mensaje y la suma de no leídos.
+    """
+    entries: Dict[tuple, Dict[str, Any]] = {}
+
+    for m in messages:
+        last_message = {
+            "id": str(m["_id"]),
+            "sender_id": m["sender_id"],
+            "content": m["content"],
+            "timestamp": m["timestamp"],
+        }
+        for owner, other, unread in (
+            (m["sender_id"], m["receiver_id"], 0),
+            (m["receiver_id"], m["sender_id"], 1),
+        ):
+            entry = entries.setdefault(
+                (owner, m["room_id"]),
+                {"other_user_id": other, "unread": 0},
+            )
+            entry["last_message"] = last_message
+            entry["unread"] += unread
+
+    return [
+        UpdateOne(
+            {"user_id": owner, "room_id": room_id},
+            _inbox_pipeline(entry["other_user_id"], entry["last_message"], entry["unread"]),
+            upsert=True,
+        )
+        for (owner, room_id), entry in entries.items()
+    ]
+
+
+def _inbox_pipeline(other_user_id: str, last_message: Dict[str, Any], unread: int) -> List[Dict[str, Any]]:
+    """
+    Update con pipeline: los no leídos siempre se suman, pero el último
+    mensaje solo se reemplaza si es más nuevo. Con write-behind en varias
+    réplicas un lote viejo puede llegar después de uno nuevo.
+    """
+    ts = last_message["timestamp"]
+    is_newer = {"$gte": [ts, {"$ifNull": ["$updated_at", datetime.min]}]}
+    return [{
+        "$set": {
+            "other_user_id": {"$literal": other_user_id},
+            "unread": {"$add": [{"$ifNull": ["$unread", 0]}, unread]},
+            # $literal: el contenido puede empezar con "$"
+            "last_message": {"$cond": [is_newer, {"$literal": last_message}, "$last_message"]},
+            "updated_at": {"$cond": [is_newer, ts, "$updated_at"]},
+        }
+    }]
+
+
+async def update_inbox(messages: List[Dict[str, Any]]):
+    updates = inbox_updates(messages)
+    if updates:
+        await db.inbox.bulk_write(updates, ordered=False)
+
+
+async def get_conversations(user_id: str, limit: int) -> List[Dict[str, Any]]:
+    """Conversaciones del usuario, la más reciente primero."""
+    cursor = (
+        db.inbox.find({"user_id": user_id})
+        .sort("updated_at", -1)
+        .limit(limit)
+    )
+    entries = [entry async for entry in cursor]
+
+    # Nombre/avatar de los otros usuarios en un solo $in
+    users = await get_authors({e["other_user_id"] for e in entries})
+
+    conversations = []
+    for e in entries:
+        other = users.get(e["other_user_id"], {})
+        conversations.append({
+            "room_id": e["room_id"],
+            "other_user_id": e["other_user_id"],
+            "other_user_name": other.get("name"),
+            "other_user_profile_image": other.get("profile_image"),
+            "last_message": e["last_message"],
+            "unread": e.get("unread", 0),
+            "updated_at": e["updated_at"],
+        })
+    return conversations
+
+
+async def mark_read(user_id: str, room_id: str):
+    await db.inbox.update_one(
+        {"user_id": user_id, "room_id": room_id},
+        {"$set": {"unread": 0, "read_at": datetime.utcnow()}},
+    )
@@ -1,10 +1,30 @@
 # app/services/posts.py
 
 from app.db.init_db import db
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.utils.images import generate_variants
+from app.utils.storage import release_upload
 from bson import ObjectId
+from pymongo import ReturnDocument
 import requests
 
 
+# ---------------------------------------
+# Cachés (por proceso)
+# ---------------------------------------
+# El feed es igual para todos los usuarios: se cachea por (limit, before).
+feed_cache = TTLCache("feed", settings.FEED_CACHE_MAX_ENTRIES, settings.FEED_CACHE_TTL_SECONDS)
+post_cache = TTLCache("post", settings.POST_CACHE_MAX_ENTRIES, settings.FEED_CACHE_TTL_SECONDS)
+
+
+def invalidate_posts_cache(post_id: str | None = None):
+    """Se llama después de cualquier escritura que cambie lo que muestra el feed."""
+    feed_cache.clear()
+    if post_id:
+        post_cache.invalidate(post_id)
+
+
 # ---------------------------------------
 # Helper para convertir ObjectId -> string
 # ---------------------------------------
@@ -29,13 +49,14 @@ def fix_post(post):
 # Crear post
 # ---------------------------------------
 async def create_post(data):
+    # user_id SIEMPRE se guarda como string (igual que el "sub" del JWT)
+    if data.get("user_id") is not None:
+        data["user_id"] = str(data["user_id"])
+
     result = await db.posts.insert_one(data)
     data["id"] = str(result.inserted_id)
 
-    # Si guardaste user_id como ObjectId en Mongo, arréglalo
-    if isinstance(data.get("user_id"), ObjectId):
-        data["user_id"] = str(data["user_id"])
-
+    invalidate_posts_cache()
     return data
 
 
@@ -43,6 +64,10 @@ async def create_post(data):
 # Obtener post por ID
 # ---------------------------------------
 async def get_post_by_id(post_id: str):
+    return await post_cache.get_or_load(post_id, lambda: _load_post_by_id(post_id))
+
+
+async def _load_post_by_id(post_id: str):
     post = await db.posts.find_one({"_id": ObjectId(post_id)})
     if not post:
         return None
@@ -54,20 +79,55 @@ async def get_post_by_id(post_id: str):
 
 
 
+# ---------------------------------------
+# Autores de un lote de posts (una sola consulta)
+# ---------------------------------------
+async def get_authors(user_ids):
+    """
+    Devuelve {user_id: user} para todos los ids recibidos usando un
+    único find con $in, en lugar de un find_one por post.
+    """
+    object_ids = {ObjectId(uid) for uid in user_ids if uid and ObjectId.is_valid(str(uid))}
+    if not object_ids:
+        return {}
+
+    cursor = db.users.find(
+        {"_id": {"$in": list(object_ids)}},
+        {"name": 1, "profile_image": 1, "profile_image_variants": 1}
+    )
+
+    authors = {}
+    async for user in cursor:
+        authors[str(user["_id"])] = user
+    return authors
+
+
 # ---------------------------------------
 # Feed general
 # ---------------------------------------
-async def get_posts_feed():
-    cursor = db.posts.find().sort("_id", -1)  # más recientes primero
-    posts = []
+async def get_posts_feed(limit: int | None = None, before: str | None = None):
+    return await feed_cache.get_or_load(
+        (limit, before), lambda: _load_posts_feed(limit, before)
+    )
 
-    async for post in cursor:
-        user = None
 
-        if post.get("user_id"):
-            user = await db.users.find_one(
-                {"_id": ObjectId(post["user_id"])}
-            )
+async def _load_posts_feed(limit: int | None = None, before: str | None = None):
+    query = {}
+    if before:
+        # Keyset: solo posts más antiguos que el cursor
+        query["_id"] = {"$lt": ObjectId(before)}
+
+    cursor = db.posts.find(query).sort("_id", -1)  # más recientes primero
+    if limit:
+        cursor = cursor.limit(limit)
+    raw_posts = await cursor.to_list(length=None)
+
+    # 👇 INFO DE LOS USUARIOS (una consulta para todo el feed)
+    authors = await get_authors({str(p["user_id"]) for p in raw_posts if p.get("user_id")})
+
+    posts = []
+    for post in raw_posts:
+        user = authors.get(str(post.get("user_id")))
 
         posts.append({
             "id": str(post["_id"]),
@@ -75,31 +135,54 @@ async def get_posts_feed():
             "description": post.get("description"),
             "details": post.get("details"),
             "image_url": post.get("image_url"),
+            "image_variants": post.get("image_variants"),
             "user_id": post.get("user_id"),
 
             # 👇 INFO DEL USUARIO
             "user_name": user.get("name") if user else "Usuario",
-            "user_profile_image": user.get("profile_image") if user else None
+            "user_profile_image": user.get("profile_image") if user else None,
+            "user_profile_image_variants": user.get("profile_image_variants") if user else None
         })
 
     return posts
 
 
+# ---------------------------------------
+# Feed paginado (cursor por _id)
+# ---------------------------------------
+async def get_posts_feed_page(limit: int, before: str | None = None):
+    return await feed_cache.get_or_load(
+        ("page", limit, before), lambda: _load_posts_feed_page(limit, before)
+    )
+
+
+async def _load_posts_feed_page(limit: int, before: str | None = None):
+    """
+    Devuelve una página del feed y el cursor para pedir la siguiente.
+    Se pide un post de más para saber si quedan páginas sin otra consulta.
+    """
+    posts = await _load_posts_feed(limit + 1, before)
 
+    next_cursor = None
+    if len(posts) > limit:
+        posts = posts[:limit]
+        next_cursor = posts[-1]["id"]
+
+    return {"items": posts, "next_cursor": next_cursor}
 
 
 # ---------------------------------------
 # Posts de un usuario
 # ---------------------------------------
 async def get_user_posts(user_id: str):
-    cursor = db.posts.find({})
+    # Consulta indexada por user_id (string).
+    # Los documentos antiguos con ObjectId se migran con
+    # scripts/migrate_post_user_ids.py
+    cursor = db.posts.find({"user_id": str(user_id)})
     posts = []
 
     async for post in cursor:
-        # ✅ cualquier forma que venga user_id
-        if str(post.get("user_id")) == str(user_id):
-            post = fix_post(post)
-            posts.append(post)
+        posts.append(fix_post(post))
 
     return posts
 
@@ -118,19 +201,60 @@ async def update_post(post_id: str, data, user_id: str):
     # Limpiar campos None
     update_data = {k: v for k, v in data.items() if v is not None}
 
+    if "image_url" in update_data:
+        # Se necesita la imagen anterior para soltar su referencia
+        previous = await db.posts.find_one_and_update(
+            {"_id": ObjectId(post_id), "user_id": user_id},
+            {"$set": update_data},
+            projection={"image_url": 1},
+            return_document=ReturnDocument.BEFORE
+        )
+        if not previous:
+            return False
+
+        await release_upload(previous.get("image_url"))
+        invalidate_posts_cache(post_id)
+        return True
+
     updated = await db.posts.update_one(
         {"_id": ObjectId(post_id), "user_id": user_id},
         {"$set": update_data}
     )
 
-    return updated.modified_count > 0
+    if updated.modified_count > 0:
+        invalidate_posts_cache(post_id)
+        return True
+    return False
+
+
+# ---------------------------------------
+# Variantes de la imagen del post (BackgroundTask)
+# ---------------------------------------
+async def build_post_image_variants(post_id: str, filename: str, image_url: str):
+    variants = await generate_variants(filename)
+    if not variants:
+        return
+
+    # Solo si la imagen no cambió mientras se generaban
+    updated = await db.posts.update_one(
+        {"_id": ObjectId(post_id), "image_url": image_url},
+        {"$set": {"image_variants": variants}}
+    )
+    if updated.modified_count > 0:
+        invalidate_posts_cache(post_id)
 
 
 # ---------------------------------------
 # Eliminar post
 # ---------------------------------------
 async def delete_post(post_id: str, user_id: str):
-    deleted = await db.posts.delete_one(
-        {"_id": ObjectId(post_id), "user_id": user_id}
+    deleted = await db.posts.find_one_and_delete(
+        {"_id": ObjectId(post_id), "user_id": user_id},
+        projection={"image_url": 1}
     )
-    return deleted.deleted_count > 0
+
+    if deleted:
+        await release_upload(deleted.get("image_url"))
+        invalidate_posts_cache(post_id)
+        return True
+    return False
@@ -0,0 +1,105 @@
+#services/presence.py
+"""
+Presencia (en línea / desconectado) y "escribiendo..." del chat.
+
+Un usuario está en línea si tiene algún WebSocket de chat abierto en
+cualquier réplica. Cada proceso guarda en la colección `presence` un
+documento por usuario conectado a él ({user_id, process, expires_at}) y
+lo renueva mientras siga conectado; si el proceso muere, el índice TTL lo
+borra y las lecturas ya lo ignoran al vencer expires_at.
+
+Los cambios de estado y los eventos de "escribiendo" viajan por el mismo
+broadcast de la sala que los mensajes, pero no se guardan: sin otras
+réplicas ni siquiera pasan por ws_events (ver MongoBroker.publish).
+"""
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Iterable
+
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from app.core.config import settings
+from app.db.init_db import db
+
+PROCESS_ID = uuid.uuid4().hex
+
+
+def presence_event(user_id: str, online: bool) -> dict:
+    return {"type": "presence", "user_id": user_id, "online": online}
+
+
+def typing_event(user_id: str) -> dict:
+    return {"type": "typing", "user_id": user_id}
+
+
+def _expires_at() -> datetime:
+    return datetime.utcnow() + timedelta(seconds=settings.WS_PRESENCE_TTL_SECONDS)
+
+
+async def mark_online(user_ids: Iterable[str]):
+    updates = [
+        UpdateOne(
+            {"_id": f"{user_id}:{PROCESS_ID}"},
+            {"$set": {"user_id": user_id, "process": PROCESS_ID, "expires_at": _expires_at()}},
+            upsert=True,
+        )
+        for user_id in user_ids
+    ]
+    if updates:
+        await db.presence.bulk_write(updates, ordered=False)
+
+
+async def mark_offline(user_id: str):
+    await db.presence.delete_one({"_id": f"{user_id}:{PROCESS_ID}"})
+
+
+async def is_online(user_id: str) -> bool:
+    doc = await db.presence.find_one(
+        {"user_id": user_id, "expires_at": {"$gt": datetime.utcnow()}},
+        {"_id": 1},
+    )
+    return doc is not None
+
+
+def allow_typing(connection) -> bool:
+    """
+    Un evento de "escribiendo" por conexión cada WS_TYPING_THROTTLE_SECONDS:
+    las teclas de esa ventana se juntan en uno solo.
+    """
+    now = time.monotonic()
+    if now - connection.last_typing < settings.WS_TYPING_THROTTLE_SECONDS:
+        return False
+    connection.last_typing = now
+    return True
+
+
+class PresenceRefresher:
+    """Renueva los documentos de presencia de los usuarios conectados a este proceso."""
+
+    def __init__(self, manager):
+        self._manager = manager
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        # Apagado ordenado: estos usuarios dejan de figurar por este proceso
+        try:
+            await db.presence.delete_many({"process": PROCESS_ID})
+        except PyMongoError as e:
+            print(f"❌ Error limpiando presencia: {e}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.WS_PRESENCE_TTL_SECONDS / 3)
+            try:
+                await mark_online(list(self._manager.users))
+            except PyMongoError as e:
+                print(f"❌ Error renovando presencia: {e}")
@@ -1,8 +1,13 @@
 #services/users.py
 from app.db.init_db import db
 from app.core.security import hash_password, verify_password, create_access_token
-from app.core.email_utils import send_verification_email, send_password_reset_email
+from app.core.email_utils import render_verification_email, render_password_reset_email
+from app.services.email_outbox import enqueue_email
+from app.services.posts import invalidate_posts_cache
+from app.utils.images import generate_variants
+from app.utils.storage import release_upload
 from bson import ObjectId
+from pymongo import ReturnDocument
 import secrets
 import uuid
 
@@ -14,14 +19,11 @@ async def create_user(data, profile_image: str | None = None):
     if existing:
         return None
 
-    hashed = hash_password(data.password)
+    hashed = await hash_password(data.password)
     
     # Generar código de verificación simple (6 dígitos)
     verification_code = str(secrets.randbelow(1000000)).zfill(6)
 
-    # 📧 ENVIAR EMAIL REAL
-    send_verification_email(data.email, verification_code)
-
     new_user = {
         "name": data.name,
         "email": data.email,
@@ -34,6 +36,10 @@ async def create_user(data, profile_image: str | None = None):
     result = await db.users.insert_one(new_user)
     new_user["id"] = str(result.inserted_id)
 
+    # 📧 ENCOLAR EMAIL (lo envía el dispatcher en segundo plano)
+    subject, html = render_verification_email(verification_code)
+    await enqueue_email(data.email, subject, html=html)
+
     return new_user
 
 
@@ -51,13 +57,14 @@ async def resend_verification_code(email: str):
     # Generar nuevo código
     code = str(secrets.randbelow(1000000)).zfill(6)
     
-    # 📧 ENVIAR EMAIL REAL
-    send_verification_email(email, code)
-
     await db.users.update_one(
         {"email": email},
         {"$set": {"verification_code": code}}
     )
+
+    # 📧 ENCOLAR EMAIL
+    subject, html = render_verification_email(code)
+    await enqueue_email(email, subject, html=html)
     return True
 
 
@@ -81,7 +88,8 @@ async def request_password_reset(email: str):
     # 🔗 ENVIAR ENLACE REAL
     # Usamos la IP pública y el puerto 30001 (Frontend)
     link = f"http://34.51.71.65:30001/reset-password?token={token}"
-    send_password_reset_email(email, link)
+    subject, html = render_password_reset_email(link)
+    await enqueue_email(email, subject, html=html)
     
     return True
 
@@ -94,7 +102,7 @@ async def reset_password(token: str, new_password: str):
     if not user:
         return False
     
-    hashed = hash_password(new_password)
+    hashed = await hash_password(new_password)
     
     await db.users.update_one(
         {"_id": user["_id"]},
@@ -114,7 +122,7 @@ async def login_user(data):
     if not user:
         return None
 
-    if not verify_password(data.password, user["hashed_password"]):
+    if not await verify_password(data.password, user["hashed_password"]):
         return None
         
     # Validar si está verificado
@@ -179,8 +187,32 @@ async def get_user_by_id(user_id: str):
 # Guardar imagen de perfil
 # -----------------------------------------
 async def update_profile_image(user_id: str, image_url: str):
-    await db.users.update_one(
+    previous = await db.users.find_one_and_update(
         {"_id": ObjectId(user_id)},
-        {"$set": {"profile_image": image_url}}
+        # Las variantes de la imagen anterior ya no sirven
+        {"$set": {"profile_image": image_url, "profile_image_variants": {}}},
+        projection={"profile_image": 1},
+        return_document=ReturnDocument.BEFORE
     )
+    if previous:
+        await release_upload(previous.get("profile_image"))
+    # El feed muestra el avatar del autor en cada post
+    invalidate_posts_cache()
     return True
+
+
+# -----------------------------------------
+# Variantes del avatar (BackgroundTask)
+# -----------------------------------------
+async def build_profile_image_variants(user_id: str, filename: str, image_url: str):
+    variants = await generate_variants(filename)
+    if not variants:
+        return
+
+    # Solo si el avatar no cambió mientras se generaban
+    updated = await db.users.update_one(
+        {"_id": ObjectId(user_id), "profile_image": image_url},
+        {"$set": {"profile_image_variants": variants}}
+    )
+    if updated.modified_count > 0:
+        invalidate_posts_cache()
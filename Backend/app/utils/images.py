@@ -0,0 +1,121 @@
+#utils/images.py
+"""
+Variantes de tamaño de las imágenes subidas (thumbnails + WebP/JPEG).
+
+El redimensionado es CPU puro, así que corre en un pool de procesos
+(fuera del event loop y del GIL) y se lanza como BackgroundTask: la
+respuesta no espera a que termine.
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from uuid import uuid4
+
+from PIL import Image, ImageOps
+
+# Anchos generados (px): tarjeta pequeña / feed móvil / pantalla completa
+VARIANT_WIDTHS = (160, 480, 1080)
+
+_pool: ProcessPoolExecutor | None = None
+
+
+def _variant_names(filename: str) -> dict[str, dict[str, str]]:
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    return {
+        str(width): {"webp": f"{stem}_{width}.webp", "jpeg": f"{stem}_{width}.jpg"}
+        for width in VARIANT_WIDTHS
+    }
+
+
+def variant_filenames(filename: str) -> list[str]:
+    """Todos los archivos de variantes que genera una imagen."""
+    return [name for names in _variant_names(filename).values() for name in names.values()]
+
+
+def render_variants(path: str, upload_dir: str) -> dict[str, dict[str, str]]:
+    """
+    Corre en un proceso hijo. Devuelve {"160": {"webp": nombre, "jpeg": nombre}, ...}.
+    Nunca agranda: si la imagen es más angosta que el ancho pedido, se usa su tamaño.
+    """
+    variants = _variant_names(path)
+
+    # Los uploads se nombran por contenido: si las variantes ya existen, son las mismas
+    if all(os.path.exists(os.path.join(upload_dir, name)) for name in variant_filenames(path)):
+        return variants
+
+    with Image.open(path) as original:
+        # Respetar la orientación EXIF de las fotos del celular
+        image = ImageOps.exif_transpose(original).convert("RGB")
+
+    for width in VARIANT_WIDTHS:
+        resized = image.copy()
+        if resized.width > width:
+            resized.thumbnail((width, round(resized.height * width / resized.width)), Image.LANCZOS)
+
+        names = variants[str(width)]
+        _save_atomic(resized, upload_dir, names["webp"], "WEBP", quality=80, method=4)
+        _save_atomic(resized, upload_dir, names["jpeg"], "JPEG", quality=82, optimize=True, progressive=True)
+
+    return variants
+
+
+def _save_atomic(image: Image.Image, upload_dir: str, name: str, fmt: str, **options):
+    """
+    Escribe a un temporal y lo renombra, igual que save_upload_file: si el
+    proceso muere a mitad nunca queda un archivo truncado con el nombre
+    final (se sirve como immutable y el chequeo de arriba lo daría por bueno).
+    """
+    tmp_path = os.path.join(upload_dir, f".{name}.{uuid4().hex}.tmp")
+    try:
+        image.save(tmp_path, fmt, **options)
+        os.replace(tmp_path, os.path.join(upload_dir, name))
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        from app.core.config import settings
+
+        # spawn: el proceso padre tiene hilos (motor, executors) y fork no es seguro
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.IMAGE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+async def generate_variants(filename: str) -> dict[str, dict[str, str]] | None:
+    """
+    Genera las variantes de uploads/<filename> y devuelve sus URLs públicas
+    con la misma forma que render_variants. None si no es una imagen válida.
+    """
+    from app.core.config import settings
+    from app.utils.storage import upload_url
+
+    path = os.path.join(settings.UPLOAD_DIR, filename)
+    try:
+        variants = await asyncio.get_running_loop().run_in_executor(
+            _get_pool(), render_variants, path, settings.UPLOAD_DIR
+        )
+    except Exception as e:
+        print(f"❌ No se pudieron generar variantes de {filename}: {e}")
+        return None
+
+    return {
+        width: {fmt: upload_url(name) for fmt, name in names.items()}
+        for width, names in variants.items()
+    }
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,64 @@
+#utils/static_files.py
+from prometheus_client import Counter
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Receive, Scope, Send
+
+# Los uploads nunca se sobrescriben (nombre = hash del contenido), así que el
+# navegador puede guardarlos un año sin volver a preguntar.
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+UPLOADS_REQUESTS = Counter(
+    "adoppets_uploads_requests_total", "Requests a /uploads por código de estado", ["status"]
+)
+UPLOADS_BYTES = Counter(
+    "adoppets_uploads_bytes_total", "Bytes de cuerpo servidos desde /uploads"
+)
+
+
+class UploadsStaticFiles(StaticFiles):
+    """
+    StaticFiles para /uploads con Cache-Control inmutable y métricas.
+
+    FileResponse ya resuelve ETag / If-None-Match / If-Modified-Since y
+    Range (206), y usa la extensión ASGI `http.response.pathsend` (envío
+    del archivo sin copiarlo por Python) cuando el servidor la soporta.
+    """
+
+    def file_response(self, full_path, stat_result, scope: Scope, status_code: int = 200):
+        response = FileResponse(
+            full_path,
+            status_code=status_code,
+            stat_result=stat_result,
+            headers={"Cache-Control": IMMUTABLE_CACHE_CONTROL},
+        )
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        sent = {"status": 500, "length": 0, "body": 0, "pathsend": False}
+
+        async def counting_send(message):
+            if message["type"] == "http.response.start":
+                sent["status"] = message["status"]
+                length = Headers(raw=message["headers"]).get("content-length")
+                sent["length"] = int(length) if length else 0
+            elif message["type"] == "http.response.body":
+                sent["body"] += len(message.get("body", b""))
+            elif message["type"] == "http.response.pathsend":
+                sent["pathsend"] = True
+            await send(message)
+
+        try:
+            await super().__call__(scope, receive, counting_send)
+        except HTTPException as e:
+            # 404/405: la respuesta la arma el middleware de excepciones
+            sent["status"] = e.status_code
+            raise
+        finally:
+            UPLOADS_REQUESTS.labels(str(sent["status"])).inc()
+            # Con pathsend el cuerpo no pasa por aquí: se usa Content-Length
+            UPLOADS_BYTES.inc(sent["length"] if sent["pathsend"] else sent["body"])
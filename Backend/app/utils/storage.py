@@ -1,15 +1,231 @@
+#utils/storage.py
+"""
+Almacén de uploads direccionado por contenido.
+
+Cada archivo se llama <sha256>.<ext>: la misma imagen subida dos veces
+(avatar en el registro y otra vez en /users/upload-avatar, o la misma foto
+en un PUT /posts/{id}) es un solo archivo en disco. Como el nombre depende
+del contenido, una URL nunca cambia de contenido (clave de caché inmutable).
+
+La colección `blobs` lleva un contador de referencias por archivo. Cuando
+llega a 0 el blob queda marcado como huérfano y scripts/gc_uploads.py lo
+borra pasado un periodo de gracia (borrarlo al instante competiría con una
+subida concurrente del mismo contenido).
+"""
+import hashlib
 import os
-from fastapi import UploadFile
-from app.core.config import settings
+import re
+from dataclasses import dataclass
+from datetime import datetime, timedelta
 from uuid import uuid4
 
-os.makedirs(settings.upload_dir, exist_ok=True)
+import aiofiles
+import aiofiles.os
+from fastapi import HTTPException, UploadFile
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+
+from app.core.config import settings
+from app.db.init_db import db
+from app.utils.images import variant_filenames
+
+os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+
+# Se copia por trozos: la memoria por upload es constante (no el tamaño del archivo)
+CHUNK_SIZE = 64 * 1024
+
+_SAFE_EXT = re.compile(r"^[a-z0-9]{1,5}$")
+
+
+@dataclass
+class StoredFile:
+    filename: str
+    path: str
+    size: int
+    sha256: str
+    # False si el contenido ya existía y no se escribió nada
+    is_new: bool
+
+
+def upload_url(filename: str) -> str:
+    return f"http://localhost:8000/uploads/{filename}"
+
+
+def filename_from_url(url: str | None) -> str | None:
+    return url.rsplit("/", 1)[-1] if url else None
+
+
+def _extension(filename: str | None) -> str:
+    ext = (filename or "").rsplit(".", 1)[-1].lower()
+    if ext == "jpeg":
+        ext = "jpg"
+    return ext if _SAFE_EXT.match(ext) else "bin"
+
+
+async def _remove_quietly(path: str):
+    try:
+        await aiofiles.os.remove(path)
+    except OSError:
+        pass
+
+
+async def save_upload_file(
+    upload_file: UploadFile,
+    max_bytes: int = settings.MAX_UPLOAD_BYTES,
+) -> StoredFile:
+    """
+    Guarda el upload (si no existía ya) y suma una referencia al blob.
+
+    1) Se lee por trozos calculando el sha256 (sin escribir nada); si supera
+       max_bytes se aborta con 413.
+    2) Solo si el blob es nuevo se vuelve a leer y se escribe con aiofiles
+       en un temporal que luego se renombra (atómico).
+    """
+    if upload_file.size is not None and upload_file.size > max_bytes:
+        raise HTTPException(status_code=413, detail="El archivo es demasiado grande")
+
+    digest = hashlib.sha256()
+    size = 0
+    while chunk := await upload_file.read(CHUNK_SIZE):
+        size += len(chunk)
+        if size > max_bytes:
+            raise HTTPException(status_code=413, detail="El archivo es demasiado grande")
+        digest.update(chunk)
+
+    sha256 = digest.hexdigest()
+    filename = f"{sha256}.{_extension(upload_file.filename)}"
+    path = os.path.join(settings.UPLOAD_DIR, filename)
+
+    before = await db.blobs.find_one_and_update(
+        {"_id": filename},
+        {
+            "$inc": {"refs": 1},
+            "$setOnInsert": {"sha256": sha256, "size": size, "created_at": datetime.utcnow()},
+            # Si el barrido lo tenía reclamado, su delete final ya no aplica
+            "$unset": {"orphaned_at": "", "deleting": "", "deleting_at": ""},
+        },
+        upsert=True,
+        return_document=ReturnDocument.BEFORE,
+    )
+
+    # Un blob con 0 referencias o reclamado por el barrido puede estar
+    # borrándose: se reescribe siempre
+    is_new = (
+        before is None
+        or before.get("refs", 0) <= 0
+        or before.get("deleting")
+        or not await aiofiles.os.path.exists(path)
+    )
+
+    if is_new:
+        tmp_path = os.path.join(settings.UPLOAD_DIR, f".{filename}.{uuid4().hex}.tmp")
+        try:
+            await upload_file.seek(0)
+            async with aiofiles.open(tmp_path, "wb") as buffer:
+                while chunk := await upload_file.read(CHUNK_SIZE):
+                    await buffer.write(chunk)
+            await aiofiles.os.replace(tmp_path, path)
+        except BaseException:
+            await _remove_quietly(tmp_path)
+            await db.blobs.update_one({"_id": filename}, {"$inc": {"refs": -1}})
+            raise
+
+    return StoredFile(filename=filename, path=path, size=size, sha256=sha256, is_new=is_new)
+
+
+async def release_upload(url: str | None):
+    """
+    Quita una referencia al blob de esa URL (post borrado, imagen o avatar
+    reemplazado). Los archivos antiguos con nombre uuid no están en `blobs`
+    y se ignoran.
+    """
+    filename = filename_from_url(url)
+    if not filename:
+        return
+
+    blob = await db.blobs.find_one_and_update(
+        {"_id": filename, "refs": {"$gt": 0}},
+        {"$inc": {"refs": -1}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if blob and blob["refs"] <= 0:
+        await db.blobs.update_one(
+            {"_id": filename, "refs": 0},
+            {"$set": {"orphaned_at": datetime.utcnow()}},
+        )
+
+
+async def release_unused_upload(stored: StoredFile | None):
+    """
+    Devuelve la referencia de un upload que al final no se usó (el request
+    falló después de guardarlo). No tapa el error original.
+    """
+    if stored is None:
+        return
+    try:
+        await release_upload(upload_url(stored.filename))
+    except PyMongoError as e:
+        print(f"❌ Error liberando upload {stored.filename}: {e}")
+
+
+def _trash_path(name: str) -> str:
+    return os.path.join(settings.UPLOAD_DIR, f".{name}.{uuid4().hex}.deleting")
+
+
+async def _move_to_trash(name: str) -> str | None:
+    trash = _trash_path(name)
+    try:
+        await aiofiles.os.replace(os.path.join(settings.UPLOAD_DIR, name), trash)
+    except OSError:
+        return None  # no estaba (p. ej. variantes que nunca se generaron)
+    return trash
+
+
+async def sweep_orphan_uploads(grace: timedelta = timedelta(hours=1)) -> int:
+    """
+    Borra del disco los blobs sin referencias desde hace más de `grace`.
+
+    Cada blob se reclama antes de tocar el disco (deleting=True) y sus
+    archivos se mueven a un nombre temporal en vez de borrarse. Si en medio
+    llega una subida del mismo contenido, save_upload_file quita el flag y
+    reescribe el archivo; el delete final no aplica y los archivos se
+    devuelven a su nombre (el contenido es el mismo, pisar es inocuo).
+    """
+    removed = 0
+    now = datetime.utcnow()
+    cutoff = now - grace
+
+    async for blob in db.blobs.find({"refs": {"$lte": 0}, "orphaned_at": {"$lt": cutoff}}, {"_id": 1}):
+        filename = blob["_id"]
+        claimed = await db.blobs.find_one_and_update(
+            {
+                "_id": filename,
+                "refs": {"$lte": 0},
+                # Un reclamo viejo es de un barrido que murió a mitad
+                "$or": [{"deleting": {"$ne": True}}, {"deleting_at": {"$lt": cutoff}}],
+            },
+            {"$set": {"deleting": True, "deleting_at": now}},
+            projection={"_id": 1},
+        )
+        if not claimed:
+            continue  # se volvió a subir o lo tiene otro barrido
+
+        trashed = {}
+        for name in [filename, *variant_filenames(filename)]:
+            trash = await _move_to_trash(name)
+            if trash:
+                trashed[name] = trash
+
+        deleted = await db.blobs.delete_one({"_id": filename, "refs": {"$lte": 0}, "deleting": True})
+        if deleted.deleted_count:
+            for trash in trashed.values():
+                await _remove_quietly(trash)
+            removed += 1
+        else:
+            for name, trash in trashed.items():
+                try:
+                    await aiofiles.os.replace(trash, os.path.join(settings.UPLOAD_DIR, name))
+                except OSError as e:
+                    print(f"❌ No se pudo restaurar {name}: {e}")
 
-async def save_upload_file(upload_file: UploadFile) -> str:
-    ext = upload_file.filename.split(".")[-1]
-    filename = f"{uuid4().hex}.{ext}"
-    path = os.path.join(settings.upload_dir, filename)
-    with open(path, "wb") as buffer:
-        content = await upload_file.read()
-        buffer.write(content)
-    return filename
+    return removed
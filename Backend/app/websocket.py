@@ -1,18 +1,372 @@
-from fastapi import WebSocket
+import asyncio
+import json
+import time
+
+from fastapi import WebSocket, WebSocketDisconnect
+from prometheus_client import Counter, Gauge, Histogram
+
+from app.core.config import settings
+from app.core.pubsub import create_broker
+
+# Código de cierre para clientes que no dan abasto ("Try Again Later")
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+WS_CONNECTIONS = Gauge("adoppets_ws_connections", "WebSockets de chat abiertos en este proceso")
+WS_ROOMS = Gauge("adoppets_ws_rooms", "Salas de chat con al menos un socket en este proceso")
+WS_USERS = Gauge("adoppets_ws_users", "Usuarios con al menos un socket en este proceso")
+# rate() de estos da mensajes/seg: "in" recibidos de clientes, "out" entregados a sockets
+WS_MESSAGES = Counter("adoppets_ws_messages_total", "Mensajes de chat por WebSocket", ["direction"])
+WS_QUEUE_DEPTH = Histogram(
+    "adoppets_ws_send_queue_depth",
+    "Mensajes esperando en la cola del socket al encolar uno nuevo",
+    buckets=(0, 1, 2, 5, 10, 25, 50, 100, 250),
+)
+WS_DROPPED = Counter(
+    "adoppets_ws_dropped_messages_total",
+    "Mensajes que no llegaron a un socket",
+    ["reason"],
+)
+WS_EVICTIONS = Counter(
+    "adoppets_ws_evictions_total",
+    "Sockets cerrados por el servidor por lentos o caídos",
+    ["reason"],
+)
+WS_MUX_LINKS = Gauge("adoppets_ws_mux_links", "Enlaces multiplexados del frontend abiertos")
+WS_MUX_BAD_FRAMES = Counter("adoppets_ws_mux_bad_frames_total", "Frames del enlace multiplexado descartados por inválidos")
+WS_MUX_CHANNELS = Gauge("adoppets_ws_mux_channels", "Canales abiertos dentro de los enlaces multiplexados")
+
+
+# Frames de control que manda el cliente; cualquier otro texto es un mensaje de chat
+CONTROL_TYPES = {"ping", "typing"}
+# Eventos que no se guardan ni se reponen: con la cola llena se descartan
+# sin desalojar al cliente
+EPHEMERAL_TYPES = {"pong", "presence", "typing"}
+
+
+def parse_control(text: str) -> dict | None:
+    """Devuelve el frame si `text` es un {"type": ...} de control, si no None."""
+    if not text.startswith("{"):
+        return None
+    try:
+        frame = json.loads(text)
+    except ValueError:
+        return None
+    if isinstance(frame, dict) and frame.get("type") in CONTROL_TYPES:
+        return frame
+    return None
+
+
+class ClientConnection:
+    """
+    Un WebSocket con su cola de salida acotada y su tarea escritora: quien
+    hace broadcast solo encola (nunca espera a la red de un cliente).
+    """
+
+    def __init__(self, websocket: WebSocket, room_id: str, user_id: str, on_evict, paused: bool = False):
+        self.websocket = websocket
+        self.room_id = room_id
+        self.user_id = user_id
+        # Último frame recibido del cliente (mensaje o ping)
+        self.last_seen = time.monotonic()
+        self.last_typing = 0.0
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.WS_SEND_QUEUE_SIZE)
+        self._on_evict = on_evict
+        # En pausa mientras se repone lo perdido al reconectar: lo que llega
+        # en vivo se acumula en la cola y se envía después, sin duplicar
+        self._resumed = asyncio.Event()
+        if not paused:
+            self._resumed.set()
+        self._skip_until_seq = 0
+        self._task = asyncio.create_task(self._writer())
+
+    def resume(self, after_seq: int | None = None):
+        """Empieza a enviar la cola, saltando los mensajes con seq <= after_seq."""
+        self._skip_until_seq = after_seq or 0
+        self._resumed.set()
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    def enqueue(self, message: dict) -> bool:
+        WS_QUEUE_DEPTH.observe(self.queue.qsize())
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def _writer(self):
+        await self._resumed.wait()
+        while True:
+            message = await self.queue.get()
+            if message.get("seq") and message["seq"] <= self._skip_until_seq:
+                continue  # ya se envió en la reposición
+            try:
+                await asyncio.wait_for(
+                    self.websocket.send_json(message),
+                    timeout=settings.WS_SEND_TIMEOUT_SECONDS,
+                )
+                WS_MESSAGES.labels("out").inc()
+            except asyncio.TimeoutError:
+                WS_DROPPED.labels("send_timeout").inc()
+                await self._on_evict(self, "send_timeout")
+                return
+            except Exception:
+                WS_DROPPED.labels("send_error").inc()
+                await self._on_evict(self, "send_error")
+                return
+
+    def cancel(self):
+        if self._task is not asyncio.current_task():
+            self._task.cancel()
+        # Lo que quedaba en cola ya no se va a enviar
+        if self.queue.qsize():
+            WS_DROPPED.labels("disconnected").inc(self.queue.qsize())
+
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: dict[str, list[WebSocket]] = {}
+    """
+    Registro de los WebSockets de chat de este proceso: sets por sala y por
+    usuario (un usuario puede tener varios dispositivos), alta y baja O(1).
+
+    broadcast() no envía directo: publica en el broker (app/core/pubsub.py),
+    que llama a deliver_local() en todos los procesos, incluido este.
+    deliver_local() solo encola en cada socket, así que un cliente lento o
+    caído no frena al resto de la sala.
+
+    Un barrido periódico cierra los sockets que no mandan nada (ni ping)
+    hace más de WS_HEARTBEAT_TIMEOUT_SECONDS.
+    """
+
+    def __init__(self, broker=None):
+        self.rooms: dict[str, set[ClientConnection]] = {}
+        self.users: dict[str, set[ClientConnection]] = {}
+        self._count = 0
+        self._broker = broker or create_broker()
+        self._sweeper: asyncio.Task | None = None
+
+        WS_CONNECTIONS.set_function(lambda: self._count)
+        WS_ROOMS.set_function(lambda: len(self.rooms))
+        WS_USERS.set_function(lambda: len(self.users))
 
-    async def connect(self, room: str, websocket: WebSocket):
+    async def start(self):
+        await self._broker.start(self.deliver_local)
+        self._sweeper = asyncio.create_task(self._sweep())
+
+    async def stop(self):
+        if self._sweeper:
+            self._sweeper.cancel()
+            self._sweeper = None
+        await self._broker.stop()
+
+    async def connect(
+        self, room_id: str, websocket: WebSocket, user_id: str, paused: bool = False
+    ) -> ClientConnection:
         await websocket.accept()
-        self.active_connections.setdefault(room, []).append(websocket)
+        connection = ClientConnection(websocket, room_id, user_id, self._evict, paused=paused)
+        self.rooms.setdefault(room_id, set()).add(connection)
+        self.users.setdefault(user_id, set()).add(connection)
+        self._count += 1
+        return connection
+
+    def disconnect(self, connection: ClientConnection):
+        room = self.rooms.get(connection.room_id, set())
+        if connection not in room:
+            return  # ya dado de baja (desalojado)
+
+        connection.cancel()
+        self._count -= 1
+        _discard(self.rooms, connection.room_id, connection)
+        _discard(self.users, connection.user_id, connection)
+
+    def user_connections(self, user_id: str) -> set[ClientConnection]:
+        """Sockets abiertos del usuario en este proceso (todos sus dispositivos)."""
+        return self.users.get(user_id, set())
+
+    async def _evict(self, connection: ClientConnection, reason: str):
+        WS_EVICTIONS.labels(reason).inc()
+        self.disconnect(connection)
+        try:
+            await connection.websocket.close(code=SLOW_CONSUMER_CLOSE_CODE)
+        except Exception:
+            pass  # ya estaba cerrado
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(settings.WS_HEARTBEAT_SWEEP_SECONDS)
+            deadline = time.monotonic() - settings.WS_HEARTBEAT_TIMEOUT_SECONDS
+            stale = [c for room in self.rooms.values() for c in room if c.last_seen < deadline]
+            for connection in stale:
+                await self._evict(connection, "heartbeat")
+
+    async def broadcast(self, room_id: str, message: dict):
+        await self._broker.publish(
+            room_id, message, ephemeral=message.get("type") in EPHEMERAL_TYPES
+        )
+
+    async def deliver_local(self, room_id: str, message: dict):
+        ephemeral = message.get("type") in EPHEMERAL_TYPES
+        slow = []
+        for connection in self.rooms.get(room_id, ()):
+            if not connection.enqueue(message):
+                WS_DROPPED.labels("queue_full").inc()
+                if not ephemeral:
+                    slow.append(connection)
+
+        # "drop": el cliente lento solo pierde este mensaje; "disconnect": se cierra
+        if settings.WS_SLOW_CONSUMER_POLICY == "disconnect":
+            for connection in slow:
+                await self._evict(connection, "queue_full")
+
+
+def _discard(index: dict[str, set], key: str, connection: ClientConnection):
+    group = index.get(key)
+    if group is not None:
+        group.discard(connection)
+        if not group:
+            del index[key]
+
+
+class MuxChannel:
+    """
+    Un canal lógico (un navegador) dentro del enlace multiplexado del
+    frontend. Expone lo que usan el router y ConnectionManager de un
+    WebSocket (accept / receive_text / send_json / close), así que cada
+    canal se atiende igual que un socket directo.
+    """
+
+    def __init__(self, link: "MuxLink", channel_id: str):
+        self.link = link
+        self.id = channel_id
+        self.cookies: dict = {}
+        self._inbox: asyncio.Queue = asyncio.Queue(maxsize=settings.WS_MUX_RECEIVE_QUEUE_SIZE + 1)
+        self.closed = False
+
+    async def accept(self):
+        pass  # el enlace ya está aceptado
+
+    def feed(self, text: str) -> bool:
+        if self._inbox.qsize() >= settings.WS_MUX_RECEIVE_QUEUE_SIZE:
+            return False
+        self._inbox.put_nowait(text)
+        return True
+
+    async def receive_text(self) -> str:
+        text = await self._inbox.get()
+        if text is None:
+            raise WebSocketDisconnect(1000)
+        return text
+
+    async def send_json(self, data: dict):
+        if self.closed:
+            raise RuntimeError("Canal cerrado")
+        await self.link.send({"op": "msg", "ch": self.id, "data": data})
+
+    async def close(self, code: int = 1000):
+        if self.closed:
+            raise RuntimeError("Canal cerrado")
+        self.disconnected()
+        try:
+            await self.link.send({"op": "closed", "ch": self.id, "code": code})
+        except Exception:
+            pass  # el enlace ya se cayó
+
+    def disconnected(self):
+        """El frontend cerró el canal (o se cayó el enlace): despierta a receive_text."""
+        if self.closed:
+            return
+        self.closed = True
+        # Siempre queda lugar para el aviso de cierre (la cola tiene uno extra)
+        self._inbox.put_nowait(None)
+
+
+class MuxLink:
+    """
+    Un WebSocket del frontend que lleva muchos canales de chat.
+
+    Frames (JSON) del frontend:
+      {"op": "open", "ch": id, "token": ..., "other": ..., "since": ..., "since_seq": ...}
+      {"op": "send", "ch": id, "text": ...}
+      {"op": "close", "ch": id}
+    y hacia el frontend:
+      {"op": "msg", "ch": id, "data": {...}}
+      {"op": "closed", "ch": id, "code": ...}
+
+    `serve_channel(channel, open_frame)` atiende cada canal en su propia
+    tarea; un "open" repetido (el frontend reconectó) reemplaza al anterior.
+    """
+
+    def __init__(self, websocket: WebSocket, serve_channel):
+        self.websocket = websocket
+        self._serve_channel = serve_channel
+        self._send_lock = asyncio.Lock()
+        self._channels: dict[str, tuple[MuxChannel, asyncio.Task]] = {}
+
+    async def send(self, frame: dict):
+        async with self._send_lock:
+            await self.websocket.send_text(json.dumps(frame, default=str))
+
+    async def serve(self):
+        WS_MUX_LINKS.inc()
+        try:
+            while True:
+                raw = await self.websocket.receive_text()
+                # Un frame roto se descarta: no tira abajo los demás canales
+                try:
+                    frame = json.loads(raw)
+                    if not isinstance(frame, dict):
+                        raise ValueError("el frame no es un objeto")
+                    await self._dispatch(frame)
+                except (ValueError, KeyError, TypeError) as e:
+                    WS_MUX_BAD_FRAMES.inc()
+                    print(f"❌ Frame inválido en el enlace de chat: {e}")
+        except WebSocketDisconnect:
+            pass
+        finally:
+            WS_MUX_LINKS.dec()
+            tasks = []
+            for channel, task in self._channels.values():
+                channel.disconnected()
+                tasks.append(task)
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _dispatch(self, frame: dict):
+        op, channel_id = frame.get("op"), frame.get("ch")
+        if op == "open":
+            self._close_channel(channel_id)
+            self._open_channel(channel_id, frame)
+            return
+
+        entry = self._channels.get(channel_id)
+        if entry is None:
+            return
+        channel, _ = entry
+
+        if op == "send":
+            if not channel.feed(frame.get("text", "")):
+                # El navegador escribe más rápido de lo que se guarda: solo cae su canal
+                WS_EVICTIONS.labels("receive_queue_full").inc()
+                await channel.close(code=SLOW_CONSUMER_CLOSE_CODE)
+        elif op == "close":
+            channel.disconnected()
+
+    def _open_channel(self, channel_id: str, frame: dict):
+        channel = MuxChannel(self, channel_id)
+        task = asyncio.create_task(self._serve_channel(channel, frame))
+        self._channels[channel_id] = (channel, task)
+        WS_MUX_CHANNELS.inc()
+
+        def forget(_):
+            WS_MUX_CHANNELS.dec()
+            if self._channels.get(channel_id, (None,))[0] is channel:
+                del self._channels[channel_id]
+
+        task.add_done_callback(forget)
 
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
+    def _close_channel(self, channel_id: str):
+        entry = self._channels.get(channel_id)
+        if entry is not None:
+            entry[0].disconnected()
 
-    async def broadcast(self, room: str, message: str):
-        for connection in self.active_connections.get(room, []):
-            await connection.send_text(message)
 
-manager = ConnectionManager()
\ No newline at end of file
+manager = ConnectionManager()
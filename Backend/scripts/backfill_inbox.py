@@ -0,0 +1,68 @@
+#scripts/backfill_inbox.py
+"""
+Reconstruye la colección inbox (bandeja de conversaciones) a partir de
+`messages`: último mensaje de cada sala para sus dos participantes.
+
+Sirve para los chats anteriores a la bandeja o si una actualización de la
+bandeja falló. No conoce los no leídos: los deja como estén (0 si la
+entrada es nueva).
+
+Es idempotente: se puede correr varias veces sin problema.
+
+Uso (desde Backend/):
+    python -m scripts.backfill_inbox
+"""
+import asyncio
+
+from pymongo import UpdateOne
+
+from app.db.indexes import INDEXES
+from app.db.init_db import db
+
+BATCH_SIZE = 500
+
+
+async def backfill():
+    await db.inbox.create_indexes(INDEXES["inbox"])
+
+    pipeline = [
+        {"$sort": {"room_id": 1, "timestamp": 1, "_id": 1}},
+        {"$group": {"_id": "$room_id", "last": {"$last": "$$ROOT"}}},
+    ]
+
+    updates = []
+    rooms = 0
+    async for row in db.messages.aggregate(pipeline, allowDiskUse=True):
+        m = row["last"]
+        last_message = {
+            "id": str(m["_id"]),
+            "sender_id": m["sender_id"],
+            "content": m["content"],
+            "timestamp": m["timestamp"],
+        }
+        for owner, other in ((m["sender_id"], m["receiver_id"]), (m["receiver_id"], m["sender_id"])):
+            updates.append(UpdateOne(
+                {"user_id": owner, "room_id": m["room_id"]},
+                {
+                    "$set": {
+                        "other_user_id": other,
+                        "last_message": last_message,
+                        "updated_at": m["timestamp"],
+                    },
+                    "$setOnInsert": {"unread": 0},
+                },
+                upsert=True,
+            ))
+        rooms += 1
+
+        if len(updates) >= BATCH_SIZE:
+            await db.inbox.bulk_write(updates, ordered=False)
+            updates = []
+
+    if updates:
+        await db.inbox.bulk_write(updates, ordered=False)
+    print(f"✅ bandeja reconstruida: {rooms} conversaciones")
+
+
+if __name__ == "__main__":
+    asyncio.run(backfill())
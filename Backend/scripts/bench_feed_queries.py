@@ -0,0 +1,95 @@
+#scripts/bench_feed_queries.py
+"""
+Benchmark: número de consultas a Mongo por cada request del feed.
+
+Siembra N posts (con autores distintos) en una base de datos de pruebas,
+llama a get_posts_feed() y cuenta los comandos que llegan a Mongo.
+El número de consultas debe quedarse constante aunque N crezca.
+
+Uso (desde Backend/):
+    BENCH_MONGO_URL=mongodb://localhost:27017/adoppets_bench \\
+        python -m scripts.bench_feed_queries 10 100 1000 2000
+"""
+import asyncio
+import os
+import sys
+import time
+from collections import Counter
+
+from pymongo import monitoring
+
+# La base de benchmark se fija ANTES de importar app.*, porque
+# app.db.init_db crea el cliente al importarse.
+os.environ["MONGO_URL"] = os.getenv(
+    "BENCH_MONGO_URL", "mongodb://localhost:27017/adoppets_bench"
+)
+
+QUERY_COMMANDS = {"find", "aggregate", "getMore"}
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.commands = Counter()
+
+    def started(self, event):
+        if event.command_name in QUERY_COMMANDS:
+            self.commands[event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+counter = CommandCounter()
+monitoring.register(counter)
+
+from app.db.init_db import db  # noqa: E402
+from app.services.posts import get_posts_feed  # noqa: E402
+
+
+async def seed(n_posts: int, n_users: int):
+    await db.users.delete_many({})
+    await db.posts.delete_many({})
+
+    users = [
+        {"name": f"user{i}", "email": f"user{i}@bench.local", "profile_image": None}
+        for i in range(n_users)
+    ]
+    result = await db.users.insert_many(users)
+    user_ids = [str(uid) for uid in result.inserted_ids]
+
+    posts = [
+        {
+            "title": f"pet {i}",
+            "description": "bench",
+            "details": None,
+            "image_url": None,
+            "user_id": user_ids[i % n_users],
+        }
+        for i in range(n_posts)
+    ]
+    await db.posts.insert_many(posts)
+
+
+async def run(sizes):
+    print(f"{'posts':>8} {'find':>6} {'aggregate':>10} {'getMore':>8} {'ms':>8}")
+    for n in sizes:
+        await seed(n, n_users=max(1, n // 4))
+
+        counter.commands.clear()
+        start = time.perf_counter()
+        feed = await get_posts_feed()
+        elapsed = (time.perf_counter() - start) * 1000
+
+        assert len(feed) == n
+        c = counter.commands
+        print(f"{n:>8} {c['find']:>6} {c['aggregate']:>10} {c['getMore']:>8} {elapsed:>8.1f}")
+
+    await db.client.drop_database(db.name)
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10, 100, 1000, 2000]
+    asyncio.run(run(sizes))
@@ -0,0 +1,28 @@
+#scripts/gc_uploads.py
+"""
+Borra del disco los uploads que ya no usa ningún post ni usuario.
+
+save_upload_file / release_upload llevan la cuenta de referencias en la
+colección `blobs`; este script elimina los blobs que llevan más de
+--grace-hours horas sin referencias (y sus variantes).
+
+Uso (desde Backend/):
+    python -m scripts.gc_uploads --grace-hours 1
+"""
+import argparse
+import asyncio
+from datetime import timedelta
+
+from app.utils.storage import sweep_orphan_uploads
+
+
+async def main(grace_hours: float):
+    removed = await sweep_orphan_uploads(timedelta(hours=grace_hours))
+    print(f"✅ uploads eliminados: {removed}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--grace-hours", type=float, default=1)
+    args = parser.parse_args()
+    asyncio.run(main(args.grace_hours))
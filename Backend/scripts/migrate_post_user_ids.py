@@ -0,0 +1,32 @@
+#scripts/migrate_post_user_ids.py
+"""
+Migración única: normaliza posts.user_id a string.
+
+Algunos posts antiguos guardaron user_id como ObjectId. El backend ahora
+siempre lo guarda y lo consulta como string (el "sub" del JWT), así que
+esos documentos dejarían de aparecer en el perfil de su dueño.
+Además crea el índice sobre posts.user_id que usa get_user_posts.
+
+Es idempotente: se puede correr varias veces sin problema.
+
+Uso (desde Backend/):
+    python -m scripts.migrate_post_user_ids
+"""
+import asyncio
+
+from app.db.init_db import db
+
+
+async def migrate():
+    result = await db.posts.update_many(
+        {"user_id": {"$type": "objectId"}},
+        [{"$set": {"user_id": {"$toString": "$user_id"}}}],
+    )
+    print(f"✅ posts migrados: {result.modified_count}")
+
+    name = await db.posts.create_index("user_id")
+    print(f"✅ índice listo: posts.{name}")
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -0,0 +1,97 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, DocumentTooLarge
+
+from app.services import chat_writer
+from app.services.chat_writer import MAX_BSON_SIZE, MessageWriter
+
+
+class FakeMessages:
+    """insert_many que falla con `errors` (en orden) y después guarda."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.saved = []
+
+    async def insert_many(self, docs, ordered=True):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.saved.extend(docs)
+
+
+@pytest.fixture
+def messages(monkeypatch):
+    fake = SimpleNamespace(messages=None)
+    monkeypatch.setattr(chat_writer, "db", fake)
+
+    async def no_inbox(docs):
+        pass
+
+    monkeypatch.setattr(chat_writer, "update_inbox", no_inbox)
+    monkeypatch.setattr(chat_writer.settings, "CHAT_FLUSH_INTERVAL_MS", 1)
+
+    def install(collection):
+        fake.messages = collection
+        return collection
+
+    return install
+
+
+def _doc(content="hola"):
+    return {"_id": ObjectId(), "room_id": "a_b", "seq": 1, "content": content}
+
+
+def _run_writer(docs, until):
+    async def scenario():
+        writer = MessageWriter()
+        writer.start()
+        for doc in docs:
+            writer.enqueue(doc)
+        for _ in range(200):
+            await asyncio.sleep(0.01)
+            if until(writer):
+                break
+        alive = not writer._task.done()
+        await writer.stop()
+        return writer, alive
+
+    return asyncio.run(scenario())
+
+
+def test_document_too_large_does_not_kill_writer(messages):
+    collection = messages(FakeMessages(DocumentTooLarge("demasiado grande")))
+    poison_before = chat_writer.CHAT_POISON._value.get()
+    huge, ok = _doc("x" * (MAX_BSON_SIZE + 1)), _doc()
+
+    writer, alive = _run_writer([huge, ok], until=lambda w: not w._pending)
+
+    assert alive
+    assert collection.saved == [ok]
+    assert writer._pending == []
+    assert chat_writer.CHAT_POISON._value.get() == poison_before + 1
+
+
+def test_permanent_write_error_is_dropped(messages):
+    bad, ok = _doc(), _doc()
+    validation = BulkWriteError({"writeErrors": [{"index": 0, "code": 121, "errmsg": "Document failed validation"}]})
+    collection = messages(FakeMessages(validation))
+
+    writer, alive = _run_writer([bad, ok], until=lambda w: not w._pending)
+
+    assert alive
+    # El insert desordenado guardó `ok`; el inválido no vuelve a la cola
+    assert writer._pending == []
+    assert collection.saved == []
+
+
+def test_unexpected_error_is_retried(messages):
+    collection = messages(FakeMessages(RuntimeError("inesperado")))
+    doc = _doc()
+
+    writer, alive = _run_writer([doc], until=lambda w: collection.saved)
+
+    assert alive
+    assert collection.saved == [doc]
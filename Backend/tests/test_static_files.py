@@ -0,0 +1,55 @@
+"""El /uploads del frontend es una copia recortada del de Backend: que no se aparten."""
+import hashlib
+import importlib.util
+from pathlib import Path
+
+import pytest
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+
+from app.utils import static_files as backend
+from app.utils.images import variant_filenames
+
+FRONTEND_MODULE = Path(__file__).resolve().parents[2] / "frontend_service" / "app" / "core" / "static_files.py"
+
+
+@pytest.fixture(scope="module")
+def frontend():
+    if not FRONTEND_MODULE.exists():
+        pytest.skip("frontend_service no está en este árbol")
+    # Se carga por ruta: los dos servicios tienen un paquete `app`
+    spec = importlib.util.spec_from_file_location("frontend_static_files", FRONTEND_MODULE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _client(static_files_cls, directory) -> TestClient:
+    return TestClient(Starlette(routes=[Mount("/uploads", static_files_cls(directory=directory))]))
+
+
+def test_same_cache_control(frontend):
+    assert frontend.IMMUTABLE_CACHE_CONTROL == backend.IMMUTABLE_CACHE_CONTROL
+
+
+def test_frontend_recognizes_backend_names(frontend):
+    filename = f"{hashlib.sha256(b'foto').hexdigest()}.jpg"
+    for name in [filename, *variant_filenames(filename)]:
+        assert frontend.HASHED_NAME.match(name), name
+
+
+def test_same_headers_for_hashed_uploads(frontend, tmp_path):
+    filename = f"{hashlib.sha256(b'foto').hexdigest()}.jpg"
+    (tmp_path / filename).write_bytes(b"foto")
+    (tmp_path / "logo.png").write_bytes(b"logo")
+
+    backend_response = _client(backend.UploadsStaticFiles, tmp_path).get(f"/uploads/{filename}")
+    frontend_response = _client(frontend.UploadsStaticFiles, tmp_path).get(f"/uploads/{filename}")
+    for header in ("cache-control", "etag", "last-modified", "content-length"):
+        assert frontend_response.headers.get(header) == backend_response.headers.get(header)
+
+    # Lo que no es un hash puede cambiar: sin immutable
+    assert "immutable" not in _client(frontend.UploadsStaticFiles, tmp_path).get("/uploads/logo.png").headers.get(
+        "cache-control", ""
+    )
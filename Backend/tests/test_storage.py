@@ -0,0 +1,77 @@
+import asyncio
+import io
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from starlette.datastructures import UploadFile
+
+from app.utils import storage
+
+CONTENT = b"\x89PNG misma imagen"
+
+
+@pytest.fixture
+def blobs_db(monkeypatch, tmp_path):
+    db = AsyncMongoMockClient()["test"]
+    monkeypatch.setattr(storage, "db", db)
+    monkeypatch.setattr(storage.settings, "UPLOAD_DIR", str(tmp_path))
+    return db
+
+
+def _upload() -> UploadFile:
+    return UploadFile(file=io.BytesIO(CONTENT), filename="foto.png", size=len(CONTENT))
+
+
+def test_reupload_during_sweep_keeps_file(blobs_db, monkeypatch, tmp_path):
+    async def scenario():
+        stored = await storage.save_upload_file(_upload())
+        await storage.release_upload(storage.upload_url(stored.filename))
+        await blobs_db.blobs.update_one(
+            {"_id": stored.filename},
+            {"$set": {"orphaned_at": datetime.utcnow() - timedelta(days=1)}},
+        )
+
+        # La subida llega justo después de que el barrido mueve el archivo
+        move = storage._move_to_trash
+        reuploads = []
+
+        async def move_then_reupload(name):
+            trash = await move(name)
+            if name == stored.filename:
+                reuploads.append(await storage.save_upload_file(_upload()))
+            return trash
+
+        monkeypatch.setattr(storage, "_move_to_trash", move_then_reupload)
+        removed = await storage.sweep_orphan_uploads()
+        return stored, reuploads, removed
+
+    stored, reuploads, removed = asyncio.run(scenario())
+
+    assert removed == 0
+    assert reuploads[0].is_new
+    assert (tmp_path / stored.filename).read_bytes() == CONTENT
+    assert not [n for n in os.listdir(tmp_path) if n.endswith(".deleting")]
+
+    blob = asyncio.run(blobs_db.blobs.find_one({"_id": stored.filename}))
+    assert blob["refs"] == 1
+    assert "deleting" not in blob
+
+
+def test_sweep_removes_orphan(blobs_db, tmp_path):
+    async def scenario():
+        stored = await storage.save_upload_file(_upload())
+        await storage.release_upload(storage.upload_url(stored.filename))
+        await blobs_db.blobs.update_one(
+            {"_id": stored.filename},
+            {"$set": {"orphaned_at": datetime.utcnow() - timedelta(days=1)}},
+        )
+        removed = await storage.sweep_orphan_uploads()
+        return stored, removed, await blobs_db.blobs.find_one({"_id": stored.filename})
+
+    stored, removed, blob = asyncio.run(scenario())
+
+    assert removed == 1
+    assert blob is None
+    assert os.listdir(tmp_path) == []
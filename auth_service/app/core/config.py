@@ -20,6 +20,14 @@ class Settings(BaseSettings):
     # Modo demo para no depender de SMTP
     DEBUG_EMAIL: bool = False
 
+    # Cola de correos (email_outbox)
+    EMAIL_BATCH_SIZE: int = 20
+    EMAIL_MAX_ATTEMPTS: int = 5
+    EMAIL_RETRY_BASE_SECONDS: float = 30
+
+    # Hilos para bcrypt (máximo de hashes simultáneos)
+    PASSWORD_HASH_WORKERS: int = 4
+
     class Config:
         env_file = ".env"
 
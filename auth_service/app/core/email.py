@@ -4,14 +4,73 @@ from email.message import EmailMessage
 from app.core.config import settings
 
 
-def send_email(*, to: str, subject: str, body: str):
+def build_message(*, to: str, subject: str, body: str) -> EmailMessage:
     msg = EmailMessage()
     msg["From"] = settings.EMAIL_FROM
     msg["To"] = to
     msg["Subject"] = subject
     msg.set_content(body)
+    return msg
 
-    with smtplib.SMTP(settings.EMAIL_HOST, settings.EMAIL_PORT) as server:
+
+class SMTPMailer:
+    """
+    Sesión SMTP reutilizable: conecta una vez (STARTTLS + login) y envía
+    varios correos por la misma conexión. No es thread-safe.
+    """
+
+    def __init__(self):
+        self._server: smtplib.SMTP | None = None
+
+    def _connect(self):
+        server = smtplib.SMTP(settings.EMAIL_HOST, settings.EMAIL_PORT, timeout=30)
         server.starttls()
         server.login(settings.EMAIL_USER, settings.EMAIL_PASSWORD)
-        server.send_message(msg)
+        self._server = server
+
+    @property
+    def connected(self) -> bool:
+        return self._server is not None
+
+    def send(self, msg: EmailMessage):
+        if self._server is None:
+            self._connect()
+        try:
+            self._server.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # El servidor cerró la sesión por inactividad: reconectar una vez
+            self.close()
+            self._connect()
+            self._server.send_message(msg)
+
+    def close(self):
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        self._server = None
+
+
+class ConsoleMailer:
+    """
+    Sustituto local de SMTP (DEBUG_EMAIL=true o tests): no envía nada,
+    imprime el correo y lo guarda en `sent`.
+    """
+
+    connected = False
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, msg: EmailMessage):
+        self.sent.append(msg)
+        print(f"[DEBUG_EMAIL] Para {msg['To']}: {msg['Subject']}\n{msg.get_content()}")
+
+    def close(self):
+        pass
+
+
+def get_mailer():
+    return ConsoleMailer() if settings.DEBUG_EMAIL else SMTPMailer()
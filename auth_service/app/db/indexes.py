@@ -0,0 +1,114 @@
+"""
+Registro declarativo de índices de Mongo del Auth Service.
+
+ensure_indexes() se ejecuta en el arranque (lifespan) y es idempotente:
+si el índice ya existe con la misma definición, Mongo no hace nada.
+
+Para comparar lo declarado con lo que hay en la base (desde auth_service/):
+    python -m app.db.indexes           # solo muestra diferencias
+    python -m app.db.indexes --apply   # crea los que faltan
+"""
+import asyncio
+import sys
+
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import PyMongoError
+
+from app.db.init_db import db
+
+# coleccion -> índices declarados
+INDEXES: dict[str, list[IndexModel]] = {
+    "auth_users": [
+        IndexModel([("email", ASCENDING)], unique=True),
+    ],
+    "email_verifications": [
+        IndexModel([("email", ASCENDING)]),
+    ],
+    "email_outbox": [
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)]),
+        # Los correos enviados se borran solos a los 7 días
+        IndexModel([("sent_at", ASCENDING)], expireAfterSeconds=7 * 24 * 3600),
+    ],
+}
+
+# Opciones que cuentan para decir si un índice vivo coincide con el declarado
+_COMPARED_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+
+async def ensure_indexes():
+    """Crea los índices declarados. Un fallo en una colección no detiene el resto."""
+    for collection, models in INDEXES.items():
+        try:
+            await db[collection].create_indexes(models)
+        except PyMongoError as e:
+            print(f"❌ No se pudieron crear índices en {collection}: {e}")
+
+
+def _spec(document: dict) -> dict:
+    return {
+        "key": [tuple(k) for k in document["key"].items()],
+        **{opt: document[opt] for opt in _COMPARED_OPTIONS if opt in document},
+    }
+
+
+def _live_spec(info: dict) -> dict:
+    return {
+        "key": [tuple(k) for k in info["key"]],
+        **{opt: info[opt] for opt in _COMPARED_OPTIONS if opt in info},
+    }
+
+
+async def diff_indexes():
+    """
+    Devuelve {coleccion: {"missing": [...], "changed": [...], "extra": [...]}}
+    con los nombres de índice que no coinciden con INDEXES.
+    """
+    report = {}
+    for collection, models in INDEXES.items():
+        live = await db[collection].index_information()
+        live.pop("_id_", None)
+
+        declared = {m.document["name"]: _spec(m.document) for m in models}
+
+        report[collection] = {
+            "missing": [name for name in declared if name not in live],
+            "changed": [
+                name for name, spec in declared.items()
+                if name in live and _live_spec(live[name]) != spec
+            ],
+            "extra": [name for name in live if name not in declared],
+        }
+    return report
+
+
+def _print_diff(report: dict) -> bool:
+    clean = True
+    for collection, diff in report.items():
+        for kind, names in diff.items():
+            for name in names:
+                clean = False
+                print(f"{kind:>8}  {collection}.{name}")
+    return clean
+
+
+async def _main(apply: bool):
+    clean = _print_diff(await diff_indexes())
+
+    if clean:
+        print("✅ Los índices coinciden con el registro")
+    elif apply:
+        await ensure_indexes()
+        # El código de salida refleja lo que quedó, no lo que había antes
+        print("Después de aplicar:")
+        clean = _print_diff(await diff_indexes())
+        if clean:
+            print("✅ Índices faltantes creados")
+        else:
+            print("⚠️ Quedan diferencias que --apply no resuelve (cambiados o sobrantes)")
+
+    return clean
+
+
+if __name__ == "__main__":
+    ok = asyncio.run(_main(apply="--apply" in sys.argv[1:]))
+    sys.exit(0 if ok else 1)
@@ -1,9 +1,27 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from prometheus_client import make_asgi_app
 from app.routers.auth_api import router as auth_router
+from app.db.indexes import ensure_indexes
+from app.core.email_outbox import dispatcher as email_dispatcher
 
-app = FastAPI(title="AdopPets Auth Service")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Índices de Mongo (idempotente)
+    await ensure_indexes()
+    email_dispatcher.start()
+    yield
+    # Termina el lote de correos en curso antes de apagar
+    await email_dispatcher.stop()
+
+
+app = FastAPI(title="AdopPets Auth Service", lifespan=lifespan)
 app.include_router(auth_router)
 
+# Métricas Prometheus (pool de bcrypt, etc.)
+app.mount("/metrics", make_asgi_app())
+
 @app.get("/")
 async def health():
     return {"status": "ok", "service": "auth"}
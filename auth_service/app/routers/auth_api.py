@@ -9,7 +9,7 @@ from app.schemas.auth import LoginRequest, RegisterRequest, TokenResponse
 from app.core.security import hash_password, verify_password, create_access_token
 from app.core.auth_deps import get_current_user
 from app.core.config import settings
-from app.core.email import send_email
+from app.core.email_outbox import enqueue_email
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -35,7 +35,7 @@ async def register(data: RegisterRequest):
         raise HTTPException(status_code=400, detail="Ya existe un usuario con ese correo")
 
     now = datetime.utcnow()  # ✅ naive UTC (Mongo friendly)
-    hashed = hash_password(data.password)
+    hashed = await hash_password(data.password)
 
     # Código de verificación email
     code = _gen_6digit_code()
@@ -64,17 +64,13 @@ async def register(data: RegisterRequest):
     result = await db.auth_users.insert_one(user_doc)
     user_id = str(result.inserted_id)
 
-    # Enviar email (código)
-    try:
-        send_email(
-            to=data.email,
-            subject="Verificación de correo | AdopPets",
-            body=f"Tu código de verificación es: {code}\nEste código expira en 10 minutos."
-        )
-    except Exception:
-        # Si el correo falla, igual creamos el usuario (pero quedará en pending)
-        # Puedes decidir si aquí prefieres borrar el user y lanzar error.
-        pass
+    # Encolar email (código). Si el envío falla, el dispatcher reintenta;
+    # el usuario queda en pending hasta verificar.
+    await enqueue_email(
+        to=data.email,
+        subject="Verificación de correo | AdopPets",
+        body=f"Tu código de verificación es: {code}\nEste código expira en 10 minutos."
+    )
 
     # OJO: puedes devolver token, pero el monolito NO debería dejar loguear hasta verificar.
     token = create_access_token(sub=user_id, email=data.email)
@@ -140,14 +136,11 @@ async def resend_verification(email: str = Form(...)):
         {"$set": {"email_verify_code_hash": code_hash, "email_verify_expires_at": exp}}
     )
 
-    try:
-        send_email(
-            to=email,
-            subject="Reenvío de código | AdopPets",
-            body=f"Tu nuevo código de verificación es: {code}\nEste código expira en 10 minutos."
-        )
-    except Exception:
-        pass
+    await enqueue_email(
+        to=email,
+        subject="Reenvío de código | AdopPets",
+        body=f"Tu nuevo código de verificación es: {code}\nEste código expira en 10 minutos."
+    )
 
     return {"message": "Si el correo existe, se reenviará un código."}
 
@@ -161,7 +154,7 @@ async def login(data: LoginRequest):
     if not user:
         raise HTTPException(status_code=401, detail="Credenciales inválidas")
 
-    if not verify_password(data.password, user.get("hashed_password", "")):
+    if not await verify_password(data.password, user.get("hashed_password", "")):
         raise HTTPException(status_code=401, detail="Credenciales inválidas")
 
     # ✅ Importante: no permitir login si no verificó
@@ -182,7 +175,7 @@ async def token(form_data: OAuth2PasswordRequestForm = Depends()):
     password = form_data.password
 
     user = await db.auth_users.find_one({"email": email})
-    if not user or not verify_password(password, user.get("hashed_password", "")):
+    if not user or not await verify_password(password, user.get("hashed_password", "")):
         raise HTTPException(status_code=401, detail="Credenciales inválidas")
 
     if user.get("is_email_verified") is not True:
@@ -227,7 +220,7 @@ async def forgot_password(email: str = Form(...)):
         f"/password-reset/reset?token={raw_token}&email={email}"
     )
 
-    send_email(
+    await enqueue_email(
         to=email,
         subject="Recuperación de contraseña | AdopPet",
         body=(
@@ -259,7 +252,7 @@ async def reset_password(email: str = Form(...), token: str = Form(...), new_pas
     if not exp or exp < datetime.utcnow():
         raise HTTPException(status_code=400, detail="Token expirado")
 
-    new_hashed = hash_password(new_password)
+    new_hashed = await hash_password(new_password)
 
     await db.auth_users.update_one(
         {"_id": user["_id"]},
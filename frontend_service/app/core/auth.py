@@ -1,13 +1,66 @@
-from fastapi import HTTPException, Cookie, Header
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException, Cookie, Header, Depends
 import httpx
+import jwt
+from jwt import PyJWTError
+from prometheus_client import Counter
 from app.core.config import settings
+from app.core.http import get_http_client
+
+AUTH_CHECKS = Counter(
+    "adoppets_frontend_auth_checks_total",
+    "Validaciones de token por resultado (cache / verified / rejected)",
+    ["result"],
+)
+
+# token -> (user_id, exp). LRU acotada: solo tokens con firma ya verificada
+_verified: OrderedDict[str, tuple[str, float]] = OrderedDict()
+
+
+def _remember(token: str, user_id: str, exp: float):
+    _verified[token] = (user_id, exp)
+    _verified.move_to_end(token)
+    while len(_verified) > settings.AUTH_TOKEN_CACHE_SIZE:
+        _verified.popitem(last=False)
+
+
+def verify_token(token: str) -> str:
+    """
+    Valida firma y expiración del JWT con la misma SECRET_KEY del backend,
+    sin llamarlo. Devuelve el user_id (claim "sub").
+    """
+    cached = _verified.get(token)
+    if cached:
+        user_id, exp = cached
+        if exp > time.time():
+            _verified.move_to_end(token)
+            AUTH_CHECKS.labels("cache").inc()
+            return user_id
+        del _verified[token]
+
+    try:
+        payload = jwt.decode(
+            token,
+            settings.SECRET_KEY,
+            algorithms=[settings.ALGORITHM],
+            options={"require": ["exp", "sub"]},
+        )
+    except PyJWTError:
+        AUTH_CHECKS.labels("rejected").inc()
+        raise HTTPException(status_code=401, detail="Token inválido o expirado")
+
+    user_id = str(payload["sub"])
+    _remember(token, user_id, float(payload["exp"]))
+    AUTH_CHECKS.labels("verified").inc()
+    return user_id
 
-# Cliente reutilizable (mejor performance)
-_client = httpx.AsyncClient(timeout=10)
 
 async def get_current_user(
     access_token: str | None = Cookie(None),
     authorization: str | None = Header(None),
+    client: httpx.AsyncClient = Depends(get_http_client),
 ) -> str:
     # 1) Obtener token desde cookie o Authorization: Bearer
     token = access_token
@@ -19,27 +72,26 @@ async def get_current_user(
         # Para simplificar dependencias de redirección, lanzamos 401 y el router maneja
         raise HTTPException(status_code=401, detail="Token no encontrado")
 
-    # 2) URL segura (apuntar al Backend Service, ya no a auth-service)
-    base = settings.BACKEND_URL.rstrip("/")
-    url = f"{base}/users/me"
+    # 2) Validación local (firma + exp): sin ida y vuelta al backend ni a Mongo.
+    #    Sin SECRET_KEY solo queda la validación remota
+    user_id = verify_token(token) if settings.SECRET_KEY else None
+
+    # 3) Solo si se necesita revocación (usuario borrado, etc.) se confirma con el backend
+    if user_id is not None and not settings.AUTH_VERIFY_REMOTE:
+        return user_id
 
-    # 3) Validar token con Auth Service
+    url = f"{settings.BACKEND_URL.rstrip('/')}/users/me"
     try:
-        resp = await _client.get(
+        resp = await client.get(
             url,
             headers={"Authorization": f"Bearer {token}"}
         )
     except Exception as e:
-        print(f"Error conectando con Auth Service: {e}")
+        print(f"Error conectando con Backend: {e}")
         raise HTTPException(status_code=503, detail="Auth service no disponible")
 
     if resp.status_code != 200:
+        _verified.pop(token, None)
         raise HTTPException(status_code=401, detail="Token inválido o expirado")
 
-    data = resp.json()
-    # El backend devuelve { "id": "...", "name": "...", ... } en /users/me
-    user_id = data.get("id")
-    if not user_id:
-        raise HTTPException(status_code=401, detail="Token inválido")
-
-    return user_id
+    return user_id or str(resp.json()["id"])
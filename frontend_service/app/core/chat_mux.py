@@ -0,0 +1,217 @@
+import asyncio
+import json
+import uuid
+
+import websockets
+from fastapi import WebSocket
+from prometheus_client import Counter, Gauge
+
+from app.core.config import settings
+
+# Mismo código que usa el backend para clientes que no dan abasto
+SLOW_CONSUMER_CLOSE_CODE = 1013
+MAX_RECONNECT_DELAY_SECONDS = 10
+
+MUX_CONNECTED = Gauge(
+    "adoppets_frontend_chat_mux_connected",
+    "1 si el enlace multiplexado con el backend está abierto",
+)
+MUX_CHANNELS = Gauge(
+    "adoppets_frontend_chat_channels",
+    "Chats de navegador abiertos sobre el enlace multiplexado",
+)
+MUX_RECONNECTS = Counter(
+    "adoppets_frontend_chat_mux_reconnects_total",
+    "Veces que se reabrió el enlace con el backend",
+)
+MUX_CLOSED = Counter(
+    "adoppets_frontend_chat_channels_closed_total",
+    "Chats cerrados por el frontend por motivo",
+    ["reason"],
+)
+
+
+class MuxChannel:
+    """Un navegador dentro del enlace: su socket y su cola de salida acotada."""
+
+    def __init__(self, websocket: WebSocket, open_frame: dict):
+        self.id = uuid.uuid4().hex
+        self.websocket = websocket
+        self.open_frame = {**open_frame, "op": "open", "ch": self.id}
+        # Un lugar extra para el aviso de cierre (None)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.CHAT_MUX_CHANNEL_QUEUE_SIZE + 1)
+        self.last_seq: int | None = None
+        self.close_code = 1000
+        self.writer: asyncio.Task | None = None
+
+    def reopen_frame(self) -> dict:
+        # Al reabrir el enlace, el backend repone desde el último seq entregado
+        if self.last_seq is None:
+            return self.open_frame
+        return {**self.open_frame, "since": None, "since_seq": self.last_seq}
+
+    def deliver(self, data: dict) -> bool:
+        if self.queue.qsize() >= settings.CHAT_MUX_CHANNEL_QUEUE_SIZE:
+            return False
+        seq = data.get("seq")
+        if isinstance(seq, int):
+            self.last_seq = max(self.last_seq or 0, seq)
+        self.queue.put_nowait(data)
+        return True
+
+    def finish(self, code: int):
+        self.close_code = code
+        self.queue.put_nowait(None)
+
+
+class BackendMux:
+    """
+    Un solo WebSocket por worker hacia el backend (/chat/mux) que lleva
+    todos los chats de los navegadores, cada uno como un canal con id
+    (protocolo en Backend/app/websocket.py, MuxLink).
+
+    - Control de flujo: hacia el backend, el envío espera al enlace (si el
+      backend va lento, el navegador deja de leerse); hacia el navegador,
+      cada canal tiene su cola y si se llena se cierra solo ese chat.
+    - Si el enlace se cae se reabre con backoff y se vuelven a abrir los
+      canales con since_seq, así el backend repone lo que faltó.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self._channels: dict[str, MuxChannel] = {}
+        self._ws = None
+        # Serializa los envíos y ordena "open" frente a la reapertura
+        self._lock = asyncio.Lock()
+        self._connected = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        delay = 0.0
+        while True:
+            try:
+                async with websockets.connect(self.url) as ws:
+                    async with self._lock:
+                        for channel in list(self._channels.values()):
+                            await ws.send(json.dumps(channel.reopen_frame()))
+                        self._ws = ws
+                    self._connected.set()
+                    MUX_CONNECTED.set(1)
+                    delay = 0.0
+
+                    async for raw in ws:
+                        await self._dispatch(json.loads(raw))
+            except (OSError, ValueError, websockets.WebSocketException) as e:
+                print(f"❌ Enlace de chat con el backend caído: {e}")
+            finally:
+                self._ws = None
+                self._connected.clear()
+                MUX_CONNECTED.set(0)
+
+            delay = min(max(delay * 2, 0.5), MAX_RECONNECT_DELAY_SECONDS)
+            await asyncio.sleep(delay)
+            MUX_RECONNECTS.inc()
+
+    async def _dispatch(self, frame: dict):
+        channel = self._channels.get(frame.get("ch"))
+        if channel is None:
+            return
+
+        if frame.get("op") == "msg":
+            if not channel.deliver(frame.get("data") or {}):
+                # El navegador no lee: se corta su chat (reconecta con since_seq)
+                MUX_CLOSED.labels("queue_full").inc()
+                self._channels.pop(channel.id, None)
+                if channel.writer:
+                    channel.writer.cancel()
+                channel.finish(SLOW_CONSUMER_CLOSE_CODE)
+                await self._send_quiet({"op": "close", "ch": channel.id})
+        elif frame.get("op") == "closed":
+            self._channels.pop(channel.id, None)
+            channel.finish(frame.get("code") or 1000)
+
+    async def send(self, frame: dict):
+        """Envía por el enlace; si está caído espera a que vuelva (con timeout)."""
+        await asyncio.wait_for(self._connected.wait(), settings.CHAT_MUX_SEND_TIMEOUT_SECONDS)
+        async with self._lock:
+            if self._ws is None:
+                raise ConnectionError("Enlace de chat caído")
+            await self._ws.send(json.dumps(frame))
+
+    async def _send_quiet(self, frame: dict):
+        async with self._lock:
+            if self._ws is None:
+                return  # al reconectar ya no se reabre
+            try:
+                await self._ws.send(json.dumps(frame))
+            except websockets.WebSocketException:
+                pass
+
+    async def serve(self, websocket: WebSocket, open_frame: dict):
+        """Atiende un navegador hasta que cierre él o el backend."""
+        channel = MuxChannel(websocket, open_frame)
+        async with self._lock:
+            self._channels[channel.id] = channel
+            if self._ws is not None:
+                try:
+                    await self._ws.send(json.dumps(channel.open_frame))
+                except websockets.WebSocketException:
+                    pass  # se abre al reconectar
+        MUX_CHANNELS.inc()
+
+        channel.writer = asyncio.create_task(self._to_browser(channel))
+        reader = asyncio.create_task(self._to_backend(channel))
+        try:
+            await asyncio.wait([channel.writer, reader], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            channel.writer.cancel()
+            reader.cancel()
+            MUX_CHANNELS.dec()
+            # Lo cerró el navegador (o se cortó acá): avisar al backend
+            if self._channels.pop(channel.id, None) is not None:
+                await self._send_quiet({"op": "close", "ch": channel.id})
+            try:
+                await websocket.close(code=channel.close_code)
+            except RuntimeError:
+                pass  # ya estaba cerrado
+
+    async def _to_browser(self, channel: MuxChannel):
+        while True:
+            data = await channel.queue.get()
+            if data is None:
+                return
+            try:
+                await channel.websocket.send_text(json.dumps(data))
+            except Exception:
+                return
+
+    async def _to_backend(self, channel: MuxChannel):
+        while True:
+            try:
+                text = await channel.websocket.receive_text()
+            except Exception:
+                return  # el navegador se fue
+            try:
+                await self.send({"op": "send", "ch": channel.id, "text": text})
+            except (asyncio.TimeoutError, ConnectionError, websockets.WebSocketException):
+                # Enlace caído: cerrar el chat, el navegador reconecta y repone
+                MUX_CLOSED.labels("backend_unavailable").inc()
+                channel.close_code = 1011
+                return
+
+
+def create_chat_mux() -> BackendMux:
+    backend_ws_url = settings.BACKEND_URL.replace("http://", "ws://").replace("https://", "wss://")
+    return BackendMux(f"{backend_ws_url.rstrip('/')}/chat/mux")
@@ -3,7 +3,34 @@ import os
 class Settings:
     BACKEND_URL: str = os.getenv("BACKEND_URL", "http://backend-service:8000")
     AUTH_SERVICE_URL: str = os.getenv("AUTH_SERVICE_URL", "http://auth-service:80")
-    SECRET_KEY: str = os.getenv("SECRET_KEY", "tu_super_secret_key_frontend")
-    ALGORITHM: str = "HS256"
+    # Misma clave/algoritmo que el Backend: el frontend valida los JWT localmente.
+    # Sin default: una clave distinta a la del backend rechaza todo token (401).
+    # Si falta, solo se arranca con AUTH_VERIFY_REMOTE (ver check_auth_settings)
+    SECRET_KEY: str | None = os.getenv("SECRET_KEY") or None
+    ALGORITHM: str = os.getenv("ALGORITHM", "HS256")
+    AUTH_TOKEN_CACHE_SIZE: int = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "1024"))
+    # true: además de la firma, confirmar cada token con /users/me (revocación)
+    AUTH_VERIFY_REMOTE: bool = os.getenv("AUTH_VERIFY_REMOTE", "false").lower() in ("1", "true", "yes")
+
+    # Pool de conexiones hacia el backend (app/core/http.py)
+    HTTP_MAX_CONNECTIONS: int = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+    HTTP_MAX_KEEPALIVE: int = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+    HTTP_KEEPALIVE_EXPIRY: float = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+    HTTP2: bool = os.getenv("HTTP2", "false").lower() in ("1", "true", "yes")
+
+    # Chat: un solo WebSocket por worker hacia el backend (app/core/chat_mux.py);
+    # false vuelve a abrir uno por navegador
+    CHAT_MUX: bool = os.getenv("CHAT_MUX", "true").lower() in ("1", "true", "yes")
+    CHAT_MUX_CHANNEL_QUEUE_SIZE: int = int(os.getenv("CHAT_MUX_CHANNEL_QUEUE_SIZE", "100"))
+    CHAT_MUX_SEND_TIMEOUT_SECONDS: float = float(os.getenv("CHAT_MUX_SEND_TIMEOUT_SECONDS", "10"))
 
 settings = Settings()
+
+
+def check_auth_settings():
+    """Se llama al arrancar: sin SECRET_KEY no hay forma de validar tokens localmente."""
+    if not settings.SECRET_KEY and not settings.AUTH_VERIFY_REMOTE:
+        raise RuntimeError(
+            "SECRET_KEY no está definida: usa la misma que el backend "
+            "o activa AUTH_VERIFY_REMOTE=true para validar los tokens con /users/me"
+        )
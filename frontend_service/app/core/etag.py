@@ -0,0 +1,18 @@
+from fastapi import Request
+import httpx
+
+# Cabeceras de caché que el backend emite y el navegador debe recibir tal cual
+_CACHE_HEADERS = ("ETag", "Cache-Control")
+
+
+def forward_validators(request: Request, headers: dict) -> dict:
+    """Copia If-None-Match del navegador a la llamada al backend."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        headers["If-None-Match"] = if_none_match
+    return headers
+
+
+def cache_headers(resp: httpx.Response) -> dict:
+    """ETag / Cache-Control de la respuesta del backend, para reenviarlos."""
+    return {name: resp.headers[name] for name in _CACHE_HEADERS if name in resp.headers}
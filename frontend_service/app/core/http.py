@@ -0,0 +1,84 @@
+import time
+
+import httpx
+from fastapi import Request
+from prometheus_client import Counter, Gauge, Histogram
+
+from app.core.config import settings
+
+# Timeouts por tipo de ruta (connect corto: el backend está en el mismo cluster)
+DEFAULT_TIMEOUT = httpx.Timeout(10, connect=2)
+UPLOAD_TIMEOUT = httpx.Timeout(60, connect=2)
+# Login / registro esperan a bcrypt en el backend
+AUTH_TIMEOUT = httpx.Timeout(15, connect=2)
+
+POOL_CONNECTIONS = Gauge(
+    "adoppets_frontend_http_pool_connections",
+    "Conexiones del pool hacia el backend por estado",
+    ["state"],
+)
+POOL_WAIT = Histogram(
+    "adoppets_frontend_http_pool_wait_seconds",
+    "Espera hasta obtener una conexión del pool",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+CONNECTIONS_OPENED = Counter(
+    "adoppets_frontend_http_connections_opened_total",
+    "Conexiones TCP nuevas hacia el backend (keep-alive no reutilizado)",
+)
+REQUESTS_INFLIGHT = Gauge(
+    "adoppets_frontend_http_requests_inflight",
+    "Requests al backend esperando respuesta",
+)
+
+
+class InstrumentedTransport(httpx.AsyncHTTPTransport):
+    """
+    Transporte de httpx que mide la espera por conexión (hasta que se abre
+    una conexión nueva o se empiezan a mandar headers por una reutilizada,
+    usando los eventos `trace` de httpcore). El estado del pool se lee al
+    momento del scrape.
+    """
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        waited = False
+
+        async def trace(event_name: str, info: dict):
+            nonlocal waited
+            if event_name == "connection.connect_tcp.started":
+                CONNECTIONS_OPENED.inc()
+            if not waited and (
+                event_name == "connection.connect_tcp.started"
+                or event_name.endswith("send_request_headers.started")
+            ):
+                waited = True
+                POOL_WAIT.observe(time.perf_counter() - start)
+
+        request.extensions = {**request.extensions, "trace": trace}
+        with REQUESTS_INFLIGHT.track_inprogress():
+            return await super().handle_async_request(request)
+
+    def count_connections(self, idle: bool) -> int:
+        return sum(1 for c in self._pool.connections if c.is_idle() == idle)
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """
+    Cliente compartido para todas las llamadas al backend (se crea en el
+    lifespan). Keep-alive + límites del pool; HTTP/2 solo si HTTP2=true
+    (requiere el paquete h2 y un backend que lo hable).
+    """
+    limits = httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+    )
+    transport = InstrumentedTransport(limits=limits, http2=settings.HTTP2)
+    POOL_CONNECTIONS.labels("active").set_function(lambda: transport.count_connections(idle=False))
+    POOL_CONNECTIONS.labels("idle").set_function(lambda: transport.count_connections(idle=True))
+    return httpx.AsyncClient(transport=transport, timeout=DEFAULT_TIMEOUT)
+
+
+def get_http_client(request: Request) -> httpx.AsyncClient:
+    return request.app.state.http_client
@@ -0,0 +1,13 @@
+def fix_variant_urls(variants: dict | None, public_base: str) -> dict | None:
+    """
+    Cambia localhost:8000 por la URL pública en las variantes de una imagen
+    ({"160": {"webp": url, "jpeg": url}, ...}), igual que con image_url.
+    """
+    if not variants:
+        return variants
+
+    for formats in variants.values():
+        for fmt, url in formats.items():
+            if url and "localhost:8000" in url:
+                formats[fmt] = url.replace("http://localhost:8000", public_base)
+    return variants
@@ -0,0 +1,60 @@
+import os
+from typing import AsyncIterator
+
+from fastapi import UploadFile
+
+# Trozo de lectura del archivo: la memoria por upload no depende de su tamaño
+CHUNK_SIZE = 64 * 1024
+
+
+def _quote(value: str) -> str:
+    # Igual que httpx: comillas y saltos de línea escapados en el header
+    return value.replace("\\", "\\\\").replace('"', "%22").replace("\r", "%0D").replace("\n", "%0A")
+
+
+class MultipartUpload:
+    """
+    Cuerpo multipart/form-data (campos + un archivo) que se envía al backend
+    trozo a trozo con httpx (`content=`), sin cargar el archivo en memoria.
+
+    El UploadFile ya viene en un SpooledTemporaryFile (a disco pasado 1 MB),
+    así que se lee de ahí por partes. Si se conoce el tamaño se manda
+    Content-Length, para que el backend pueda rechazar con 413 de entrada.
+    """
+
+    def __init__(self, data: dict, file: UploadFile, field_name: str = "file"):
+        self.boundary = os.urandom(16).hex()
+        self.file = file
+
+        parts = []
+        for name, value in data.items():
+            if value is None:
+                continue
+            parts.append(
+                f'--{self.boundary}\r\n'
+                f'Content-Disposition: form-data; name="{_quote(name)}"\r\n\r\n'
+                f'{value}\r\n'.encode()
+            )
+        self._fields = b"".join(parts)
+        self._file_header = (
+            f'--{self.boundary}\r\n'
+            f'Content-Disposition: form-data; name="{_quote(field_name)}"; '
+            f'filename="{_quote(file.filename or "upload")}"\r\n'
+            f'Content-Type: {file.content_type or "application/octet-stream"}\r\n\r\n'
+        ).encode()
+        self._closing = f"\r\n--{self.boundary}--\r\n".encode()
+
+    @property
+    def headers(self) -> dict:
+        headers = {"Content-Type": f"multipart/form-data; boundary={self.boundary}"}
+        if self.file.size is not None:
+            length = len(self._fields) + len(self._file_header) + self.file.size + len(self._closing)
+            headers["Content-Length"] = str(length)
+        return headers
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        yield self._fields + self._file_header
+        await self.file.seek(0)
+        while chunk := await self.file.read(CHUNK_SIZE):
+            yield chunk
+        yield self._closing
@@ -0,0 +1,33 @@
+#core/static_files.py
+"""
+/uploads del frontend. Las fotos se sirven desde el backend (las URLs
+apuntan a él, ver Backend/app/utils/static_files.py); aquí solo se
+marcan como inmutables los archivos con nombre de hash, que son los
+únicos que nunca cambian de contenido.
+
+Backend/tests/test_static_files.py comprueba que no se aparte del backend.
+"""
+import re
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# <sha256>.<ext> y sus variantes <sha256>_<ancho>.<ext>
+HASHED_NAME = re.compile(r"^[0-9a-f]{64}(_\d+)?\.[a-z0-9]{1,5}$")
+
+
+class UploadsStaticFiles(StaticFiles):
+    """StaticFiles que añade Cache-Control inmutable a los archivos con nombre de hash."""
+
+    def file_response(self, full_path, stat_result, scope: Scope, status_code: int = 200):
+        headers = None
+        if HASHED_NAME.match(str(full_path).rsplit("/", 1)[-1]):
+            headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL}
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, headers=headers)
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
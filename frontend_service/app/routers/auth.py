@@ -4,8 +4,9 @@ from fastapi import (
     Form,
     UploadFile,
     File,
+    Depends,
 )
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, Response
 from fastapi.templating import Jinja2Templates
 
 import uuid
@@ -13,6 +14,10 @@ import shutil
 import httpx
 
 from app.core.config import settings
+from app.core.etag import forward_validators, cache_headers
+from app.core.http import get_http_client, AUTH_TIMEOUT, UPLOAD_TIMEOUT
+from app.core.images import fix_variant_urls
+from app.core.multipart import MultipartUpload
 
 router = APIRouter()
 templates = Jinja2Templates(directory="app/templates")
@@ -39,16 +44,16 @@ async def login_page(request: Request):
 async def login_submit(
     request: Request,
     email: str = Form(...),
-    password: str = Form(...)
+    password: str = Form(...),
+    client: httpx.AsyncClient = Depends(get_http_client),
 ):
     try:
-        async with httpx.AsyncClient() as client:
-            # Backend espera JSON para Login (UserLogin logic)
-            resp = await client.post(
-                f"{settings.BACKEND_URL}/users/login",
-                json={"email": email, "password": password},
-                timeout=10
-            )
+        # Backend espera JSON para Login (UserLogin logic)
+        resp = await client.post(
+            f"{settings.BACKEND_URL}/users/login",
+            json={"email": email, "password": password},
+            timeout=AUTH_TIMEOUT
+        )
 
         # ✅ Si el auth_service dice "no verificado" -> ir a pantalla de verificación
         if resp.status_code == 403:
@@ -104,7 +109,8 @@ async def register_submit(
     email: str = Form(...),
     password: str = Form(...),
     confirm_password: str = Form(...),
-    file: UploadFile | None = File(None)
+    file: UploadFile | None = File(None),
+    client: httpx.AsyncClient = Depends(get_http_client),
 ):
     # 1️⃣ Validar contraseñas
     if password != confirm_password:
@@ -122,30 +128,22 @@ async def register_submit(
         "password": password
     }
     
-    files_payload = None
-    if file and file.filename:
-        # Leemos el archivo para re-enviarlo
-        file_content = await file.read()
-        files_payload = {
-            "file": (file.filename, file_content, file.content_type)
-        }
-        await file.seek(0) # Resetear puntero por si acaso se necesitara leer de nuevo (aunque aquí terminamos)
-
     # 3️⃣ Registrar en Backend Service
-    async with httpx.AsyncClient() as client:
-        if files_payload:
-            resp = await client.post(
-                f"{settings.BACKEND_URL}/users/register",
-                data=data_payload,
-                files=files_payload,
-                timeout=10
-            ) 
-        else:
-            resp = await client.post(
-                f"{settings.BACKEND_URL}/users/register",
-                data=data_payload,
-                timeout=10
-            )
+    if file and file.filename:
+        # El avatar se reenvía por trozos, sin leerlo entero en memoria
+        upload = MultipartUpload(data_payload, file)
+        resp = await client.post(
+            f"{settings.BACKEND_URL}/users/register",
+            content=upload,
+            headers=upload.headers,
+            timeout=UPLOAD_TIMEOUT
+        ) 
+    else:
+        resp = await client.post(
+            f"{settings.BACKEND_URL}/users/register",
+            data=data_payload,
+            timeout=AUTH_TIMEOUT
+        )
 
     if resp.status_code != 200:
         # Intentar obtener detalle del error del backend
@@ -190,18 +188,21 @@ async def forgot_password_page(request: Request):
 # FORGOT PASSWORD (POST)
 # ============================
 @router.post("/forgot-password", response_class=HTMLResponse)
-async def forgot_password_submit(request: Request, email: str = Form(...)):
-    async with httpx.AsyncClient() as client:
-        # Llama al back: /users/request-password-reset
-        url = f"{settings.BACKEND_URL.rstrip('/')}/users/request-password-reset"
-        try:
-            resp = await client.post(url, json={"email": email}, timeout=10)
-        except Exception:
-            return templates.TemplateResponse(
-                "forgot_password.html",
-                {"request": request, "error": "Error conectando al servicio.", "message": None},
-                status_code=503
-            )
+async def forgot_password_submit(
+    request: Request,
+    email: str = Form(...),
+    client: httpx.AsyncClient = Depends(get_http_client),
+):
+    # Llama al back: /users/request-password-reset
+    url = f"{settings.BACKEND_URL.rstrip('/')}/users/request-password-reset"
+    try:
+        resp = await client.post(url, json={"email": email})
+    except Exception:
+        return templates.TemplateResponse(
+            "forgot_password.html",
+            {"request": request, "error": "Error conectando al servicio.", "message": None},
+            status_code=503
+        )
             
     # Siempre mostramos éxito por seguridad (para no revelar si existe el email o no)
     return templates.TemplateResponse(
@@ -233,7 +234,8 @@ async def reset_password_submit(
     request: Request,
     token: str = Form(...),
     new_password: str = Form(...),
-    confirm_password: str = Form(...)
+    confirm_password: str = Form(...),
+    client: httpx.AsyncClient = Depends(get_http_client),
 ):
     if new_password != confirm_password:
         return templates.TemplateResponse(
@@ -242,9 +244,8 @@ async def reset_password_submit(
             status_code=400
         )
         
-    async with httpx.AsyncClient() as client:
-        url = f"{settings.BACKEND_URL.rstrip('/')}/users/reset-password"
-        resp = await client.post(url, json={"token": token, "new_password": new_password}, timeout=10)
+    url = f"{settings.BACKEND_URL.rstrip('/')}/users/reset-password"
+    resp = await client.post(url, json={"token": token, "new_password": new_password}, timeout=AUTH_TIMEOUT)
         
     if resp.status_code != 200:
         return templates.TemplateResponse(
@@ -261,25 +262,28 @@ async def reset_password_submit(
 # USER PROFILE (PROXY) - GET /users/me
 # ============================
 @router.get("/users/me")
-async def get_my_user_proxy(request: Request):
+async def get_my_user_proxy(request: Request, client: httpx.AsyncClient = Depends(get_http_client)):
     token = request.cookies.get("access_token")
     headers = {}
     if token:
         headers["Authorization"] = f"Bearer {token}"
+    forward_validators(request, headers)
         
-    async with httpx.AsyncClient() as client:
-        try:
-            resp = await client.get(f"{settings.BACKEND_URL}/users/me", headers=headers, timeout=10)
-            if resp.status_code == 200:
-                user_data = resp.json()
+    try:
+        resp = await client.get(f"{settings.BACKEND_URL}/users/me", headers=headers)
+        if resp.status_code == 304:
+            return Response(status_code=304, headers=cache_headers(resp))
+        if resp.status_code == 200:
+            user_data = resp.json()
                 
-                # CORRECCIÓN DE IMAGEN DE PERFIL
-                PUBLIC_BACKEND_URL = "http://34.51.71.65:30000"
-                if user_data.get("profile_image") and "localhost:8000" in user_data["profile_image"]:
-                    user_data["profile_image"] = user_data["profile_image"].replace("http://localhost:8000", PUBLIC_BACKEND_URL)
+            # CORRECCIÓN DE IMAGEN DE PERFIL
+            PUBLIC_BACKEND_URL = "http://34.51.71.65:30000"
+            if user_data.get("profile_image") and "localhost:8000" in user_data["profile_image"]:
+                user_data["profile_image"] = user_data["profile_image"].replace("http://localhost:8000", PUBLIC_BACKEND_URL)
+            fix_variant_urls(user_data.get("profile_image_variants"), PUBLIC_BACKEND_URL)
                 
-                return user_data
-            else:
-                return JSONResponse(status_code=404, content={"detail": "Not found"})
-        except Exception:
-            return JSONResponse(status_code=404, content={"detail": "Error fetching user"})
+            return JSONResponse(content=user_data, headers=cache_headers(resp))
+        else:
+            return JSONResponse(status_code=404, content={"detail": "Not found"})
+    except Exception:
+        return JSONResponse(status_code=404, content={"detail": "Error fetching user"})
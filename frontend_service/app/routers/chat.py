@@ -1,7 +1,10 @@
-from fastapi import APIRouter, Request, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi import APIRouter, Request, WebSocket, WebSocketDisconnect, HTTPException, Depends
+from fastapi.responses import JSONResponse
+from urllib.parse import urlencode
 import httpx
 import websockets
 from app.core.config import settings
+from app.core.http import get_http_client
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
@@ -9,26 +12,74 @@ router = APIRouter(prefix="/chat", tags=["Chat"])
 # HISTORIAL DE MENSAJES (PROXY HTTP)
 # ============================
 @router.get("/messages/{other_user_id}")
-async def get_chat_history_proxy(request: Request, other_user_id: str):
+async def get_chat_history_proxy(request: Request, other_user_id: str, client: httpx.AsyncClient = Depends(get_http_client)):
     token = request.cookies.get("access_token")
     headers = {}
     if token:
         headers["Authorization"] = f"Bearer {token}"
         
-    async with httpx.AsyncClient() as client:
-        try:
-            # Backend: /chat/messages/{other_user_id}
-            url = f"{settings.BACKEND_URL}/chat/messages/{other_user_id}"
-            resp = await client.get(url, headers=headers, timeout=10)
+    # Paginación opcional (?limit=&before=&after=), se reenvía tal cual al backend
+    params = {k: v for k, v in request.query_params.items() if k in ("limit", "before", "after")}
+    paginated = "limit" in params
+
+    try:
+        # Backend: /chat/messages/{other_user_id}
+        url = f"{settings.BACKEND_URL}/chat/messages/{other_user_id}"
+        resp = await client.get(url, params=params, headers=headers)
             
-            if resp.status_code == 200:
-                return resp.json()
-            else:
-                return []
-        except Exception as e:
-            print(f"Error fetching chat messages: {e}")
+        if resp.status_code == 200:
+            return resp.json()
+        else:
+            return {"items": [], "next_cursor": None} if paginated else []
+    except Exception as e:
+        print(f"Error fetching chat messages: {e}")
+        return {"items": [], "next_cursor": None} if paginated else []
+
+
+# ============================
+# BANDEJA DE CONVERSACIONES (PROXY HTTP)
+# ============================
+@router.get("/conversations")
+async def get_conversations_proxy(request: Request, client: httpx.AsyncClient = Depends(get_http_client)):
+    token = request.cookies.get("access_token")
+    headers = {}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+
+    try:
+        resp = await client.get(
+            f"{settings.BACKEND_URL}/chat/conversations",
+            params={k: v for k, v in request.query_params.items() if k == "limit"},
+            headers=headers,
+        )
+        if resp.status_code != 200:
             return []
 
+        conversations = resp.json()
+        PUBLIC_BACKEND_URL = "http://34.51.71.65:30000"
+        for conv in conversations:
+            image = conv.get("other_user_profile_image")
+            if image and "localhost:8000" in image:
+                conv["other_user_profile_image"] = image.replace("http://localhost:8000", PUBLIC_BACKEND_URL)
+        return conversations
+    except Exception as e:
+        print(f"Error fetching conversations: {e}")
+        return []
+
+
+@router.post("/conversations/{other_user_id}/read")
+async def read_conversation_proxy(request: Request, other_user_id: str, client: httpx.AsyncClient = Depends(get_http_client)):
+    token = request.cookies.get("access_token")
+    headers = {}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+
+    try:
+        resp = await client.post(f"{settings.BACKEND_URL}/chat/conversations/{other_user_id}/read", headers=headers)
+        return JSONResponse(status_code=resp.status_code, content=resp.json())
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 
 # ============================
 # WEBSOCKET PROXY
@@ -42,9 +93,23 @@ async def websocket_proxy(websocket: WebSocket, other_user_id: str):
         await websocket.close(code=4003) # Forbidden
         return
 
+    # Por defecto, un canal dentro del enlace multiplexado del worker
+    if settings.CHAT_MUX:
+        since_seq = websocket.query_params.get("since_seq", "")
+        await websocket.app.state.chat_mux.serve(websocket, {
+            "token": token,
+            "other": other_user_id,
+            "since": websocket.query_params.get("since"),
+            "since_seq": int(since_seq) if since_seq.isdigit() else None,
+        })
+        return
+
     # Construir URL del backend pero cambiando http/https por ws/wss
     backend_ws_url = settings.BACKEND_URL.replace("http://", "ws://").replace("https://", "wss://")
-    backend_ws_url = f"{backend_ws_url}/chat/ws/{other_user_id}?token={token}"
+    # since / since_seq: reconexión, el backend repone solo lo que faltó
+    params = {"token": token}
+    params.update({k: v for k, v in websocket.query_params.items() if k in ("since", "since_seq")})
+    backend_ws_url = f"{backend_ws_url}/chat/ws/{other_user_id}?{urlencode(params)}"
 
     try:
         async with websockets.connect(backend_ws_url) as backend_ws:
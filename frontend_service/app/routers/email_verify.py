@@ -1,11 +1,12 @@
 # Backend/app/routers/email_verify.py
 
-from fastapi import APIRouter, Request, Form
+from fastapi import APIRouter, Request, Form, Depends
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 import httpx
 
 from app.core.config import settings
+from app.core.http import get_http_client
 
 router = APIRouter(prefix="/email-verify", tags=["Email Verify"])
 templates = Jinja2Templates(directory="app/templates")
@@ -28,7 +29,7 @@ async def _post_verify_email(client: httpx.AsyncClient, email: str, code: str) -
     url = f"{settings.BACKEND_URL.rstrip('/')}/users/verify-email"
 
     # Backend espera JSON: { "email": "...", "code": "..." }
-    resp = await client.post(url, json={"email": email, "code": code}, timeout=10)
+    resp = await client.post(url, json={"email": email, "code": code})
 
     # Si el backend respondiera 422 (que no debería si usamos Pydantic/JSON bien),
     # podríamos reintentar, pero el backend está configurado para JSON (VerifyEmailRequest).
@@ -42,7 +43,7 @@ async def _post_resend_verification(client: httpx.AsyncClient, email: str) -> ht
     # Este endpoint aun no existe en backend (TBD), pero lo dejamos apuntado
     url = f"{settings.BACKEND_URL.rstrip('/')}/users/resend-verification"
 
-    resp = await client.post(url, json={"email": email}, timeout=10)
+    resp = await client.post(url, json={"email": email})
     return resp
 
 
@@ -64,6 +65,7 @@ async def verify_email_code(
     email: str = Form(...),
     code: str = Form(...),
     flow: str = Form("email_verify"),
+    client: httpx.AsyncClient = Depends(get_http_client),
 ):
     email_n = _normalize_email(email)
     code_n = _normalize_code(code)
@@ -84,8 +86,7 @@ async def verify_email_code(
         )
 
     try:
-        async with httpx.AsyncClient() as client:
-            resp = await _post_verify_email(client, email_n, code_n)
+        resp = await _post_verify_email(client, email_n, code_n)
     except Exception:
         return templates.TemplateResponse(
             "verify_code.html",
@@ -137,6 +138,7 @@ async def resend_email_code(
     request: Request,
     email: str = Form(...),
     flow: str = Form("email_verify"),
+    client: httpx.AsyncClient = Depends(get_http_client),
 ):
     email_n = _normalize_email(email)
 
@@ -148,8 +150,7 @@ async def resend_email_code(
         )
 
     try:
-        async with httpx.AsyncClient() as client:
-            resp = await _post_resend_verification(client, email_n)
+        resp = await _post_resend_verification(client, email_n)
     except Exception:
         return templates.TemplateResponse(
             "verify_code.html",
@@ -14,7 +14,7 @@ async def home_page(
     request: Request,
     user_id: str = Depends(get_current_user)
 ):
-    # Si llega aquí, ya está autenticado (token validado por auth_service)
+    # Si llega aquí, ya está autenticado (JWT validado localmente)
     return templates.TemplateResponse(
         "home.html",
         {"request": request}
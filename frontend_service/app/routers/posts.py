@@ -1,9 +1,13 @@
 from fastapi import APIRouter, Request, Form, UploadFile, File, Depends, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, Response
 from fastapi.templating import Jinja2Templates
 import httpx
 from app.core.config import settings
 from app.core.auth import get_current_user
+from app.core.http import get_http_client, UPLOAD_TIMEOUT
+from app.core.etag import forward_validators, cache_headers
+from app.core.images import fix_variant_urls
+from app.core.multipart import MultipartUpload
 
 router = APIRouter(prefix="/posts", tags=["Posts"])
 templates = Jinja2Templates(directory="app/templates")
@@ -33,7 +37,8 @@ async def create_post_submit(
     description: str = Form(...),
     details: str = Form(None),
     file: UploadFile = File(None),
-    user_id: str = Depends(get_current_user)
+    user_id: str = Depends(get_current_user),
+    client: httpx.AsyncClient = Depends(get_http_client),
 ):
     # Preparamos los datos
     data_payload = {
@@ -42,41 +47,31 @@ async def create_post_submit(
         "details": details or ""
     }
     
-    files_payload = None
-    file_content = None
-    
-    if file and file.filename:
-        file_content = await file.read()
-        files_payload = {
-            "file": (file.filename, file_content, file.content_type)
-        }
-    
     token = request.cookies.get("access_token")
     headers = {"Authorization": f"Bearer {token}"}
     
-    async with httpx.AsyncClient() as client:
-        try:
-            if files_payload:
-                resp = await client.post(
-                    f"{settings.BACKEND_URL}/posts/",
-                    data=data_payload,
-                    files=files_payload,
-                    headers=headers,
-                    timeout=20
-                )
-            else:
-                resp = await client.post(
-                    f"{settings.BACKEND_URL}/posts/",
-                    data=data_payload,
-                    headers=headers,
-                    timeout=20
-                )
-        except Exception as e:
-            return templates.TemplateResponse(
-                "create_post.html",
-                {"request": request, "error": f"Error de conexión: {e}"},
-                status_code=500
+    try:
+        if file and file.filename:
+            # El archivo se reenvía por trozos, sin leerlo entero en memoria
+            upload = MultipartUpload(data_payload, file)
+            resp = await client.post(
+                f"{settings.BACKEND_URL}/posts/",
+                content=upload,
+                headers={**headers, **upload.headers},
+                timeout=UPLOAD_TIMEOUT
+            )
+        else:
+            resp = await client.post(
+                f"{settings.BACKEND_URL}/posts/",
+                data=data_payload,
+                headers=headers
             )
+    except Exception as e:
+        return templates.TemplateResponse(
+            "create_post.html",
+            {"request": request, "error": f"Error de conexión: {e}"},
+            status_code=500
+        )
 
     if resp.status_code != 200:
         return templates.TemplateResponse(
@@ -93,86 +88,128 @@ async def create_post_submit(
 # FEED (PROXY) - GET /posts/feed/all
 # ============================
 @router.get("/feed/all")
-async def get_feed_proxy(request: Request):
+async def get_feed_proxy(request: Request, client: httpx.AsyncClient = Depends(get_http_client)):
     token = request.cookies.get("access_token")
     headers = {}
     if token:
         headers["Authorization"] = f"Bearer {token}"
-        
-    async with httpx.AsyncClient() as client:
-        try:
-            # Llamamos al backend: /posts/feed/all
-            resp = await client.get(f"{settings.BACKEND_URL}/posts/feed/all", headers=headers, timeout=10)
-            if resp.status_code == 200:
-                posts = resp.json()
-                # CORRECCIÓN DE URLs DE IMÁGENES AL VUELO
-                # Reemplazamos localhost:8000 por la IP pública del backend (Puerto 30000)
-                PUBLIC_BACKEND_URL = "http://34.51.71.65:30000"
+
+    # Paginación opcional (?limit=&before=), se reenvía tal cual al backend
+    params = {k: v for k, v in request.query_params.items() if k in ("limit", "before")}
+    paginated = "limit" in params
+    forward_validators(request, headers)
+
+    try:
+        # Llamamos al backend: /posts/feed/all
+        resp = await client.get(f"{settings.BACKEND_URL}/posts/feed/all", params=params, headers=headers)
+        # El navegador ya tiene la versión actual
+        if resp.status_code == 304:
+            return Response(status_code=304, headers=cache_headers(resp))
+        if resp.status_code == 200:
+            data = resp.json()
+            posts = data["items"] if paginated else data
+            # CORRECCIÓN DE URLs DE IMÁGENES AL VUELO
+            # Reemplazamos localhost:8000 por la IP pública del backend (Puerto 30000)
+            PUBLIC_BACKEND_URL = "http://34.51.71.65:30000"
                 
-                for post in posts:
-                    # Fix Post Image
-                    if post.get("image_url") and "localhost:8000" in post["image_url"]:
-                        post["image_url"] = post["image_url"].replace("http://localhost:8000", PUBLIC_BACKEND_URL)
+            for post in posts:
+                # Fix Post Image
+                if post.get("image_url") and "localhost:8000" in post["image_url"]:
+                    post["image_url"] = post["image_url"].replace("http://localhost:8000", PUBLIC_BACKEND_URL)
                     
-                    # Fix User Avatar in Feed
-                    if post.get("user_profile_image") and "localhost:8000" in post["user_profile_image"]:
-                        post["user_profile_image"] = post["user_profile_image"].replace("http://localhost:8000", PUBLIC_BACKEND_URL)
+                # Fix User Avatar in Feed
+                if post.get("user_profile_image") and "localhost:8000" in post["user_profile_image"]:
+                    post["user_profile_image"] = post["user_profile_image"].replace("http://localhost:8000", PUBLIC_BACKEND_URL)
+
+                # Fix thumbnails / WebP
+                fix_variant_urls(post.get("image_variants"), PUBLIC_BACKEND_URL)
+                fix_variant_urls(post.get("user_profile_image_variants"), PUBLIC_BACKEND_URL)
                 
-                return posts
-            else:
-                return []
-        except Exception as e:
-            print(f"Error fetching feed: {e}")
-            return []
+            # La corrección de URLs es determinista: el ETag del backend sigue siendo válido
+            return JSONResponse(content=data, headers=cache_headers(resp))
+        else:
+            return {"items": [], "next_cursor": None} if paginated else []
+    except Exception as e:
+        print(f"Error fetching feed: {e}")
+        return {"items": [], "next_cursor": None} if paginated else []
 
 
 # ============================
 # MIS POSTS (PROXY) - GET /posts/user/me
 # ============================
 @router.get("/user/me")
-async def get_my_posts_proxy(request: Request):
+async def get_my_posts_proxy(request: Request, client: httpx.AsyncClient = Depends(get_http_client)):
     token = request.cookies.get("access_token")
     headers = {}
     if token:
         headers["Authorization"] = f"Bearer {token}"
         
-    async with httpx.AsyncClient() as client:
-        try:
-            # Llamamos al backend: /posts/user/me
-            resp = await client.get(f"{settings.BACKEND_URL}/posts/user/me", headers=headers, timeout=10)
-            if resp.status_code == 200:
-                posts = resp.json()
-                # CORRECCIÓN DE URLs DE IMÁGENES
-                PUBLIC_BACKEND_URL = "http://34.51.71.65:30000"
+    try:
+        # Llamamos al backend: /posts/user/me
+        resp = await client.get(f"{settings.BACKEND_URL}/posts/user/me", headers=headers)
+        if resp.status_code == 200:
+            posts = resp.json()
+            # CORRECCIÓN DE URLs DE IMÁGENES
+            PUBLIC_BACKEND_URL = "http://34.51.71.65:30000"
                 
-                for post in posts:
-                    if post.get("image_url") and "localhost:8000" in post["image_url"]:
-                        post["image_url"] = post["image_url"].replace("http://localhost:8000", PUBLIC_BACKEND_URL)
+            for post in posts:
+                if post.get("image_url") and "localhost:8000" in post["image_url"]:
+                    post["image_url"] = post["image_url"].replace("http://localhost:8000", PUBLIC_BACKEND_URL)
+                fix_variant_urls(post.get("image_variants"), PUBLIC_BACKEND_URL)
                 
-                return posts
-            else:
-                return []
-        except Exception as e:
-            print(f"Error fetching my posts: {e}")
+            return posts
+        else:
             return []
+    except Exception as e:
+        print(f"Error fetching my posts: {e}")
+        return []
+
+
+# ============================
+# POST POR ID (PROXY) - GET /posts/{post_id}
+# ============================
+@router.get("/{post_id}")
+async def get_post_proxy(request: Request, post_id: str, client: httpx.AsyncClient = Depends(get_http_client)):
+    token = request.cookies.get("access_token")
+    headers = {}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    forward_validators(request, headers)
+
+    try:
+        resp = await client.get(f"{settings.BACKEND_URL}/posts/{post_id}", headers=headers)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if resp.status_code == 304:
+        return Response(status_code=304, headers=cache_headers(resp))
+    if resp.status_code != 200:
+        return JSONResponse(status_code=resp.status_code, content=resp.json())
+
+    post = resp.json()
+    PUBLIC_BACKEND_URL = "http://34.51.71.65:30000"
+    if post.get("image_url") and "localhost:8000" in post["image_url"]:
+        post["image_url"] = post["image_url"].replace("http://localhost:8000", PUBLIC_BACKEND_URL)
+    fix_variant_urls(post.get("image_variants"), PUBLIC_BACKEND_URL)
+
+    return JSONResponse(content=post, headers=cache_headers(resp))
 
 
 # ============================
 # ELIMINAR POST (PROXY) - DELETE /posts/{post_id}
 # ============================
 @router.delete("/{post_id}")
-async def delete_post_proxy(request: Request, post_id: str):
+async def delete_post_proxy(request: Request, post_id: str, client: httpx.AsyncClient = Depends(get_http_client)):
     token = request.cookies.get("access_token")
     headers = {}
     if token:
         headers["Authorization"] = f"Bearer {token}"
         
-    async with httpx.AsyncClient() as client:
-        try:
-            resp = await client.delete(f"{settings.BACKEND_URL}/posts/{post_id}", headers=headers, timeout=10)
-            return resp.json()
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
+    try:
+        resp = await client.delete(f"{settings.BACKEND_URL}/posts/{post_id}", headers=headers)
+        return resp.json()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 
 # ============================
@@ -185,7 +222,8 @@ async def update_post_proxy(
     title: str = Form(None),
     description: str = Form(None),
     details: str = Form(None),
-    file: UploadFile = File(None)
+    file: UploadFile = File(None),
+    client: httpx.AsyncClient = Depends(get_http_client),
 ):
     token = request.cookies.get("access_token")
     headers = {}
@@ -197,35 +235,27 @@ async def update_post_proxy(
     if description: data_payload["description"] = description
     if details: data_payload["details"] = details
     
-    files_payload = None
-    if file and file.filename:
-        file_content = await file.read()
-        files_payload = {
-            "file": (file.filename, file_content, file.content_type)
-        }
-    
-    async with httpx.AsyncClient() as client:
-        try:
-            if files_payload:
-                resp = await client.put(
-                    f"{settings.BACKEND_URL}/posts/{post_id}",
-                    data=data_payload,
-                    files=files_payload,
-                    headers=headers,
-                    timeout=10
-                )
-            else:
-                resp = await client.put(
-                    f"{settings.BACKEND_URL}/posts/{post_id}",
-                    data=data_payload,
-                    headers=headers,
-                    timeout=10
-                )
+    try:
+        if file and file.filename:
+            # El archivo se reenvía por trozos, sin leerlo entero en memoria
+            upload = MultipartUpload(data_payload, file)
+            resp = await client.put(
+                f"{settings.BACKEND_URL}/posts/{post_id}",
+                content=upload,
+                headers={**headers, **upload.headers},
+                timeout=UPLOAD_TIMEOUT
+            )
+        else:
+            resp = await client.put(
+                f"{settings.BACKEND_URL}/posts/{post_id}",
+                data=data_payload,
+                headers=headers
+            )
             
-            if resp.status_code == 200:
-                return resp.json()
-            else:
-                # Retornamos el error del back
-                return JSONResponse(status_code=resp.status_code, content=resp.json())
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
+        if resp.status_code == 200:
+            return resp.json()
+        else:
+            # Retornamos el error del back
+            return JSONResponse(status_code=resp.status_code, content=resp.json())
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -5,6 +5,34 @@ let currentUser = null;            // { id, name, avatar }
 let currentChatUser = null;        // { id, name, avatar }
 let chatSocket = null;
 
+// Paginación del feed (scroll infinito)
+const FEED_PAGE_SIZE = 12;
+let feedCursor = null;             // _id del último post cargado
+let feedLoading = false;
+let feedDone = false;
+
+// Historial del chat por páginas (se cargan más viejos al subir)
+const CHAT_PAGE_SIZE = 30;
+let chatCursor = null;             // id del mensaje más viejo cargado
+let chatLoading = false;
+
+// Reconexión del WebSocket: se pide solo lo posterior al último mensaje visto
+let chatLastSeq = null;            // seq más alto recibido en la sala
+let chatLastId = null;             // id del último mensaje (si no hay seq)
+let chatSeenIds = new Set();       // para no pintar dos veces un mensaje repuesto
+let chatReconnectTimer = null;
+let chatReconnectDelay = 1000;
+const CHAT_RECONNECT_MAX_DELAY = 30000;
+// El backend cierra los sockets que no mandan nada en 75 s
+const CHAT_HEARTBEAT_MS = 25000;
+
+// Presencia y "escribiendo..." (no se guardan, solo viajan por el socket)
+const CHAT_TYPING_THROTTLE_MS = 2000;   // como mucho un aviso cada 2 s
+const CHAT_TYPING_VISIBLE_MS = 4000;    // cuánto se muestra sin nuevos avisos
+let chatOtherOnline = false;
+let chatLastTypingSent = 0;
+let chatTypingTimer = null;
+
 
 // ============================
 // Cargar datos del usuario
@@ -25,7 +53,9 @@ async function loadUser() {
         currentUser = {
             id: data.id,
             name: data.name,
-            avatar: data.profile_image || "/static/img/default-avatar.svg"
+            avatar: smallVariant(data.profile_image_variants)
+                || data.profile_image
+                || "/static/img/default-avatar.svg"
         };
 
         document.getElementById("username").textContent = currentUser.name;
@@ -39,68 +69,125 @@ async function loadUser() {
 
 
 // ============================
-// Cargar feed de publicaciones
+// Cargar feed de publicaciones (por páginas)
 // ============================
 async function loadFeed() {
+    if (feedLoading || feedDone) return;
+    feedLoading = true;
+
     try {
-        const res = await fetch("/posts/feed/all");
+        const params = new URLSearchParams({ limit: FEED_PAGE_SIZE });
+        if (feedCursor) params.set("before", feedCursor);
+
+        const res = await fetch(`/posts/feed/all?${params}`);
         if (!res.ok) {
             console.error("Error cargando feed");
             return;
         }
 
-        const posts = await res.json();
+        const page = await res.json();
         const container = document.getElementById("feed-container");
-        container.innerHTML = "";
-
-        posts.forEach(p => {
-            const postUserAvatar =
-                p.user_profile_image || "/static/img/default-avatar.svg";
-
-            const isMine = currentUser && p.user_id === currentUser.id;
-
-            container.innerHTML += `
-                <div class="post-card">
-                    <div class="post-header">
-                        <div class="post-user">
-                            <img
-                                src="${postUserAvatar}"
-                                class="post-avatar"
-                            >
-                            <span class="post-username">${p.user_name || "Usuario"}</span>
-                        </div>
-                        ${isMine
-                    ? ""
-                    : `<button
-                                        class="post-message-btn"
-                                        data-user-id="${p.user_id}"
-                                        data-user-name="${p.user_name || 'Usuario'}"
-                                        data-user-avatar="${postUserAvatar}"
-                                    >
-                                        Enviar mensaje
-                                   </button>`
-                }
-                    </div>
-
-                    ${p.image_url
-                    ? `<img src="${p.image_url}" class="post-image">`
-                    : ""
-                }
+        if (!feedCursor) container.innerHTML = "";
 
-                    <div class="post-content">
-                        <h3>${p.title}</h3>
-                        <p>${p.description}</p>
-                    </div>
-                </div>
-            `;
+        page.items.forEach(p => {
+            container.insertAdjacentHTML("beforeend", renderPostCard(p));
         });
 
+        feedCursor = page.next_cursor;
+        feedDone = !page.next_cursor;
+
         // Después de renderizar, enganchar los botones de mensaje
         attachMessageButtons();
 
     } catch (error) {
         console.error("Error cargando publicaciones:", error);
+    } finally {
+        feedLoading = false;
+    }
+}
+
+// ============================
+// Variantes de imagen (thumbnails / WebP)
+// ============================
+// variants = { "160": { webp, jpeg }, "480": {...}, "1080": {...} }
+function smallVariant(variants) {
+    return variants && variants["160"] ? variants["160"].jpeg : null;
+}
+
+// <picture> con WebP + JPEG: el navegador elige el ancho según sizes
+function pictureHtml(variants, fallbackSrc, cls, sizes) {
+    if (!variants || !variants["480"]) {
+        return `<img src="${fallbackSrc}" class="${cls}" loading="lazy">`;
     }
+
+    const widths = Object.keys(variants).sort((a, b) => a - b);
+    const srcset = fmt => widths.map(w => `${variants[w][fmt]} ${w}w`).join(", ");
+
+    return `
+        <picture>
+            <source type="image/webp" srcset="${srcset("webp")}" sizes="${sizes}">
+            <img src="${variants["480"].jpeg}" srcset="${srcset("jpeg")}" sizes="${sizes}"
+                 class="${cls}" loading="lazy">
+        </picture>
+    `;
+}
+
+function renderPostCard(p) {
+    const postUserAvatar =
+        smallVariant(p.user_profile_image_variants)
+        || p.user_profile_image
+        || "/static/img/default-avatar.svg";
+
+    const isMine = currentUser && p.user_id === currentUser.id;
+
+    return `
+        <div class="post-card">
+            <div class="post-header">
+                <div class="post-user">
+                    <img
+                        src="${postUserAvatar}"
+                        class="post-avatar"
+                    >
+                    <span class="post-username">${p.user_name || "Usuario"}</span>
+                </div>
+                ${isMine
+            ? ""
+            : `<button
+                                class="post-message-btn"
+                                data-user-id="${p.user_id}"
+                                data-user-name="${p.user_name || 'Usuario'}"
+                                data-user-avatar="${postUserAvatar}"
+                            >
+                                Enviar mensaje
+                           </button>`
+        }
+            </div>
+
+            ${p.image_url
+            ? pictureHtml(p.image_variants, p.image_url, "post-image", "(max-width: 640px) 100vw, 600px")
+            : ""
+        }
+
+            <div class="post-content">
+                <h3>${p.title}</h3>
+                <p>${p.description}</p>
+            </div>
+        </div>
+    `;
+}
+
+// Pide la siguiente página cuando el sentinel entra en pantalla
+function setupInfiniteScroll() {
+    const sentinel = document.getElementById("feed-sentinel");
+    if (!sentinel) return;
+
+    const observer = new IntersectionObserver((entries) => {
+        if (entries.some(e => e.isIntersecting)) {
+            loadFeed();
+        }
+    }, { rootMargin: "400px" });
+
+    observer.observe(sentinel);
 }
 
 
@@ -108,9 +195,11 @@ async function loadFeed() {
 // Enganchar botones "Enviar mensaje"
 // ============================
 function attachMessageButtons() {
-    const buttons = document.querySelectorAll(".post-message-btn");
+    // Solo los botones nuevos (el feed se va agregando por páginas)
+    const buttons = document.querySelectorAll(".post-message-btn:not([data-bound])");
 
     buttons.forEach(btn => {
+        btn.dataset.bound = "1";
         btn.addEventListener("click", () => {
             const otherUserId = btn.dataset.userId;
             const otherUserName = btn.dataset.userName;
@@ -144,106 +233,276 @@ function openChatPopup(otherUser) {
     // Datos en el header
     document.getElementById("chat-user-name").textContent = otherUser.name;
     document.getElementById("chat-user-avatar").src = otherUser.avatar;
+    chatOtherOnline = false;
+    renderChatStatus(false);
 
     // Limpiar mensajes previos
     const list = document.getElementById("chat-messages");
     list.innerHTML = "";
 
     // Cerrar socket anterior si existe
-    if (chatSocket) {
-        chatSocket.close();
-        chatSocket = null;
-    }
-
-    // 1) Cargar historial por HTTP
-    loadChatHistory(otherUser.id);
-
-    // 2) Abrir WebSocket
-    openChatSocket(otherUser.id);
+    closeChatSocket();
+
+    // 1) Cargar historial por HTTP (y dejar la conversación como leída)
+    // 2) Abrir WebSocket desde el último mensaje cargado: no se pierde nada entre medio
+    loadChatHistory(otherUser.id)
+        .then(() => {
+            if (currentChatUser?.id === otherUser.id) openChatSocket(otherUser.id);
+        })
+        .then(() => markConversationRead(otherUser.id))
+        .then(refreshChatListIfOpen);
 }
 
 function closeChatPopup() {
     document.getElementById("chat-overlay").classList.add("hidden");
     document.getElementById("chat-modal").classList.add("hidden");
 
-    if (chatSocket) {
-        chatSocket.close();
-        chatSocket = null;
-    }
+    closeChatSocket();
+    currentChatUser = null;
+
+    refreshChatListIfOpen();
 }
 
 
 // ============================
 // Historial HTTP
 // ============================
+async function fetchChatPage(otherUserId, before = null) {
+    const params = new URLSearchParams({ limit: CHAT_PAGE_SIZE });
+    if (before) params.set("before", before);
+
+    const res = await fetch(`/chat/messages/${otherUserId}?${params}`, {
+        credentials: "include"
+    });
+
+    if (!res.ok) {
+        console.warn("No se pudo cargar el historial de chat");
+        return null;
+    }
+    return res.json();
+}
+
+// Lleva la cuenta del último mensaje visto (para reconectar con ?since_seq=)
+function rememberMessage(msg) {
+    chatSeenIds.add(msg.id);
+    if (msg.seq != null && (chatLastSeq == null || msg.seq > chatLastSeq)) {
+        chatLastSeq = msg.seq;
+    }
+    chatLastId = msg.id;
+}
+
 async function loadChatHistory(otherUserId) {
-    try {
-        const res = await fetch(`/chat/messages/${otherUserId}`, {
-            credentials: "include"
-        });
+    chatCursor = null;
+    chatLoading = true;
 
-        if (!res.ok) {
-            console.warn("No se pudo cargar el historial de chat");
-            return;
-        }
+    try {
+        const page = await fetchChatPage(otherUserId);
+        // El usuario pudo cambiar de chat mientras cargaba
+        if (!page || currentChatUser?.id !== otherUserId) return;
 
-        const messages = await res.json();
         const list = document.getElementById("chat-messages");
         list.innerHTML = "";
+        chatSeenIds = new Set();
+        chatLastSeq = null;
+        chatLastId = null;
 
-        messages.forEach(msg => {
+        page.items.forEach(msg => {
+            rememberMessage(msg);
             appendMessageBubble(msg);
         });
+        chatCursor = page.next_cursor;
 
         // Scroll al final
         list.scrollTop = list.scrollHeight;
 
     } catch (err) {
         console.error("Error cargando historial de chat:", err);
+    } finally {
+        chatLoading = false;
+    }
+}
+
+// Mensajes anteriores al llegar arriba del todo
+async function loadOlderMessages() {
+    if (chatLoading || !chatCursor || !currentChatUser) return;
+    chatLoading = true;
+
+    const otherUserId = currentChatUser.id;
+    try {
+        const page = await fetchChatPage(otherUserId, chatCursor);
+        if (!page || currentChatUser?.id !== otherUserId) return;
+
+        const list = document.getElementById("chat-messages");
+        // Mantener a la vista el mensaje que se estaba leyendo
+        const fromBottom = list.scrollHeight - list.scrollTop;
+
+        const fragment = document.createDocumentFragment();
+        page.items.forEach(msg => {
+            chatSeenIds.add(msg.id);
+            const bubble = createMessageBubble(msg);
+            if (bubble) fragment.appendChild(bubble);
+        });
+        list.prepend(fragment);
+        chatCursor = page.next_cursor;
+
+        list.scrollTop = list.scrollHeight - fromBottom;
+
+    } catch (err) {
+        console.error("Error cargando mensajes anteriores:", err);
+    } finally {
+        chatLoading = false;
     }
 }
 
+function setupChatScroll() {
+    const list = document.getElementById("chat-messages");
+    list.addEventListener("scroll", () => {
+        if (list.scrollTop < 80) {
+            loadOlderMessages();
+        }
+    });
+}
+
 
 // ============================
 // WebSocket
 // ============================
 function openChatSocket(otherUserId) {
     const protocol = location.protocol === "https:" ? "wss" : "ws";
-    const wsUrl = `${protocol}://${location.host}/chat/ws/${otherUserId}`;
+
+    // Reponer solo lo que llegó después del último mensaje visto
+    const params = new URLSearchParams();
+    if (chatLastSeq != null) {
+        params.set("since_seq", chatLastSeq);
+    } else if (chatLastId) {
+        params.set("since", chatLastId);
+    }
+    const query = params.toString() ? `?${params}` : "";
+    const wsUrl = `${protocol}://${location.host}/chat/ws/${otherUserId}${query}`;
 
     const list = document.getElementById("chat-messages");
 
-    chatSocket = new WebSocket(wsUrl);
+    const socket = new WebSocket(wsUrl);
+    chatSocket = socket;
+    let heartbeat = null;
 
-    chatSocket.onopen = () => {
+    socket.onopen = () => {
         console.log("WebSocket de chat conectado");
+        chatReconnectDelay = 1000;
+
+        heartbeat = setInterval(() => {
+            if (socket.readyState === WebSocket.OPEN) {
+                socket.send(JSON.stringify({ type: "ping" }));
+            }
+        }, CHAT_HEARTBEAT_MS);
     };
 
-    chatSocket.onmessage = (event) => {
+    socket.onmessage = (event) => {
         try {
             const msg = JSON.parse(event.data);
+
+            // El hueco era demasiado grande: recargar el historial
+            if (msg.type === "resync") {
+                loadChatHistory(otherUserId);
+                return;
+            }
+            if (msg.type === "pong") return;
+            // Rechazado por el backend (p. ej. demasiado largo): no se guardó
+            if (msg.type === "error") {
+                alert(msg.detail || "No se pudo enviar el mensaje");
+                return;
+            }
+            if (msg.type === "presence") {
+                if (msg.user_id === otherUserId) {
+                    chatOtherOnline = msg.online;
+                    renderChatStatus(false);
+                }
+                return;
+            }
+            if (msg.type === "typing") {
+                if (msg.user_id === otherUserId) showTyping();
+                return;
+            }
+
+            // Ya pintado (historial o reposición)
+            if (chatSeenIds.has(msg.id)) return;
+
+            rememberMessage(msg);
             appendMessageBubble(msg);
             list.scrollTop = list.scrollHeight;
+
+            // Llegó su mensaje: ya no está escribiendo
+            if (msg.sender_id === otherUserId) renderChatStatus(false);
+
+            // Con el chat abierto, lo que llega ya se leyó
+            if (currentUser && msg.sender_id !== currentUser.id) {
+                markConversationRead(otherUserId);
+            }
         } catch (e) {
             console.error("Error parseando mensaje de WS:", e);
         }
     };
 
-    chatSocket.onclose = () => {
+    socket.onclose = () => {
         console.log("WebSocket de chat cerrado");
+        clearInterval(heartbeat);
+
+        // Cierre inesperado (deploy, cambio de red): reconectar con backoff
+        if (chatSocket === socket && currentChatUser?.id === otherUserId) {
+            chatSocket = null;
+            chatReconnectTimer = setTimeout(() => openChatSocket(otherUserId), chatReconnectDelay);
+            chatReconnectDelay = Math.min(chatReconnectDelay * 2, CHAT_RECONNECT_MAX_DELAY);
+        }
     };
 
-    chatSocket.onerror = (e) => {
+    socket.onerror = (e) => {
         console.error("Error en WebSocket:", e);
     };
 }
 
+// Debajo del nombre: "Escribiendo...", "En línea" o "Desconectado"
+function renderChatStatus(typing) {
+    clearTimeout(chatTypingTimer);
+    const status = document.getElementById("chat-user-status");
 
-// Crea una burbujita en el popup
-function appendMessageBubble(msg) {
-    if (!currentUser) return;
+    if (typing) {
+        status.textContent = "Escribiendo...";
+    } else {
+        status.textContent = chatOtherOnline ? "En línea" : "Desconectado";
+    }
+    status.classList.toggle("online", typing || chatOtherOnline);
+}
 
-    const list = document.getElementById("chat-messages");
+function showTyping() {
+    renderChatStatus(true);
+    chatTypingTimer = setTimeout(() => renderChatStatus(false), CHAT_TYPING_VISIBLE_MS);
+}
+
+function sendTyping() {
+    const now = Date.now();
+    if (now - chatLastTypingSent < CHAT_TYPING_THROTTLE_MS) return;
+    if (!chatSocket || chatSocket.readyState !== WebSocket.OPEN) return;
+
+    chatLastTypingSent = now;
+    chatSocket.send(JSON.stringify({ type: "typing" }));
+}
+
+function closeChatSocket() {
+    clearTimeout(chatReconnectTimer);
+    chatReconnectTimer = null;
+    chatReconnectDelay = 1000;
+
+    if (chatSocket) {
+        const socket = chatSocket;
+        chatSocket = null;   // onclose ve que fue intencional
+        socket.close();
+    }
+}
+
+
+// Crea una burbujita para el popup
+function createMessageBubble(msg) {
+    if (!currentUser) return null;
 
     const div = document.createElement("div");
     div.classList.add("chat-message");
@@ -253,7 +512,14 @@ function appendMessageBubble(msg) {
 
     div.textContent = msg.content;
 
-    list.appendChild(div);
+    return div;
+}
+
+function appendMessageBubble(msg) {
+    const bubble = createMessageBubble(msg);
+    if (bubble) {
+        document.getElementById("chat-messages").appendChild(bubble);
+    }
 }
 
 
@@ -273,14 +539,117 @@ function setupChatForm() {
 
         chatSocket.send(text);
         input.value = "";
+        chatLastTypingSent = 0;
+    });
+
+    input.addEventListener("input", () => {
+        if (input.value.trim()) sendTyping();
     });
 }
 
 
 // ============================
-// Chat sidebar (futuro)
+// Mis chats (bandeja de conversaciones)
 // ============================
-// Aquí luego podemos enganchar “Mis chats” + puntito rojo
+async function loadConversations() {
+    const container = document.getElementById("chat-list");
+
+    try {
+        const res = await fetch("/chat/conversations", {
+            credentials: "include"
+        });
+        if (!res.ok) return;
+
+        const conversations = await res.json();
+        container.innerHTML = "";
+
+        if (conversations.length === 0) {
+            const empty = document.createElement("p");
+            empty.classList.add("chat-list-empty");
+            empty.textContent = "Todavía no tienes chats";
+            container.appendChild(empty);
+            return;
+        }
+
+        conversations.forEach(conv => {
+            container.appendChild(renderConversationItem(conv));
+        });
+
+    } catch (err) {
+        console.error("Error cargando conversaciones:", err);
+    }
+}
+
+function renderConversationItem(conv) {
+    const other = {
+        id: conv.other_user_id,
+        name: conv.other_user_name || "Usuario",
+        avatar: conv.other_user_profile_image || "/static/img/default-avatar.svg"
+    };
+
+    const item = document.createElement("div");
+    item.classList.add("chat-list-item");
+
+    const avatar = document.createElement("img");
+    avatar.classList.add("chat-list-avatar");
+    avatar.src = other.avatar;
+    avatar.alt = other.name;
+
+    const text = document.createElement("div");
+    text.classList.add("chat-list-text");
+
+    const name = document.createElement("div");
+    name.classList.add("chat-list-name");
+    name.textContent = other.name;
+
+    const preview = document.createElement("div");
+    preview.classList.add("chat-list-preview");
+    const mine = currentUser && conv.last_message.sender_id === currentUser.id;
+    preview.textContent = (mine ? "Tú: " : "") + conv.last_message.content;
+
+    text.append(name, preview);
+    item.append(avatar, text);
+
+    if (conv.unread > 0) {
+        const badge = document.createElement("span");
+        badge.classList.add("chat-list-unread");
+        badge.textContent = conv.unread;
+        item.appendChild(badge);
+    }
+
+    item.addEventListener("click", () => openChatPopup(other));
+    return item;
+}
+
+async function markConversationRead(otherUserId) {
+    try {
+        await fetch(`/chat/conversations/${otherUserId}/read`, {
+            method: "POST",
+            credentials: "include"
+        });
+    } catch (err) {
+        console.error("Error marcando conversación como leída:", err);
+    }
+}
+
+function setupChatList() {
+    const toggle = document.getElementById("chat-list-toggle");
+    const container = document.getElementById("chat-list");
+
+    toggle.addEventListener("click", (e) => {
+        e.preventDefault();
+        container.classList.toggle("hidden");
+        if (!container.classList.contains("hidden")) {
+            loadConversations();
+        }
+    });
+}
+
+function refreshChatListIfOpen() {
+    if (!document.getElementById("chat-list").classList.contains("hidden")) {
+        loadConversations();
+    }
+}
 
 
 // ============================
@@ -288,7 +657,7 @@ function setupChatForm() {
 // ============================
 document.addEventListener("DOMContentLoaded", () => {
     loadUser().then(() => {
-        loadFeed();
+        loadFeed().then(setupInfiniteScroll);
     });
 
     // Botón cerrar popup
@@ -299,4 +668,6 @@ document.addEventListener("DOMContentLoaded", () => {
         .addEventListener("click", closeChatPopup);
 
     setupChatForm();
+    setupChatScroll();
+    setupChatList();
 });
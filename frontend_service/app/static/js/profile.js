@@ -23,8 +23,11 @@ async function loadProfileUser() {
         // Avatar
         const avatarEl = document.getElementById("profile-avatar");
         if (avatarEl) {
+            const variants = user.profile_image_variants;
             avatarEl.src =
-                user.profile_image || "/static/img/default-avatar.svg";
+                (variants && variants["480"] ? variants["480"].jpeg : null)
+                || user.profile_image
+                || "/static/img/default-avatar.svg";
         }
 
     } catch (err) {
@@ -92,6 +95,17 @@ function renderPost(post) {
     const img = document.createElement("img");
     img.src = post.image_url || "/static/img/default-avatar.svg";
     img.alt = post.title || "Publicación";
+    img.loading = "lazy";
+
+    // Grilla del perfil: basta con las variantes chicas
+    const variants = post.image_variants;
+    if (variants && variants["480"]) {
+        img.src = variants["480"].jpeg;
+        img.srcset = Object.keys(variants)
+            .map(w => `${variants[w].jpeg} ${w}w`)
+            .join(", ");
+        img.sizes = "(max-width: 640px) 33vw, 300px";
+    }
 
     /* Overlay */
     const overlay = document.createElement("div");
@@ -1,11 +1,34 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request
 from fastapi.responses import RedirectResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
+from prometheus_client import make_asgi_app
 import httpx
 import os
 
-app = FastAPI()
+from app.core.chat_mux import create_chat_mux
+from app.core.config import check_auth_settings, settings
+from app.core.http import create_http_client
+from app.core.static_files import UploadsStaticFiles
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    check_auth_settings()
+    # Un solo cliente HTTP (pool keep-alive) para todas las llamadas al backend
+    app.state.http_client = create_http_client()
+    # Un solo WebSocket hacia el backend para todos los chats de este worker
+    app.state.chat_mux = create_chat_mux()
+    if settings.CHAT_MUX:
+        app.state.chat_mux.start()
+    yield
+    await app.state.chat_mux.stop()
+    await app.state.http_client.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Configuración de URLs de servicios
 # En Kubernetes: http://backend-service:8000
@@ -17,7 +40,9 @@ AUTH_URL = os.getenv("AUTH_URL", "http://auth-service:80")
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 # Montar uploads (para ver las fotos que se suben)
 os.makedirs("uploads", exist_ok=True)
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+app.mount("/uploads", UploadsStaticFiles(directory="uploads"), name="uploads")
+# Métricas Prometheus
+app.mount("/metrics", make_asgi_app())
 
 templates = Jinja2Templates(directory="app/templates")
 